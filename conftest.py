@@ -0,0 +1,6 @@
+'''pytest configuration, the repo root is added to sys.path so tests can import lib & config'''
+import os
+
+# numba's tbb threading layer hangs the interpreter at exit once the process has forked
+# (the compositing tests run numba in the pytest process, generate_batch forks it)
+os.environ.setdefault('NUMBA_THREADING_LAYER', 'workqueue')
@@ -1,13 +1,17 @@
 '''Script used to process Advice Reddit Json to create
 both the audio & video for upload to TikTok'''
-from typing import NoReturn
-import json
+from typing import Dict, NoReturn
+from os import cpu_count
 from os.path import join
 from argparse import ArgumentParser, Namespace
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import repeat
+import orjson
 
-from lib.generate_audio import AudioGenerator
-from lib.generate_video import VideoGenerator
+from lib.generate_audio import MAX_TTS_REQUESTS, get_audio_generator
+from lib.generate_video import (DECODERS, HW_ENCODERS, RENDERERS, get_video_generator, limit_worker_threads,
+                                select_video_encoder)
 from config.base import CONFIG
 
 
@@ -41,45 +45,169 @@ def create_parser() -> ArgumentParser:
                         type=int,
                         default=180,
                         help='length in seconds for output video')
+    parser.add_argument('--max_workers',
+                        type=int,
+                        default=cpu_count(),
+                        help='number of posts to generate in parallel, defaults to cpu count')
+    parser.add_argument('--hwaccel',
+                        type=str,
+                        default='auto',
+                        choices=['auto', 'none', *HW_ENCODERS],
+                        help='hardware encoder for output video, auto uses first available gpu encoder. '
+                        'needs an ffmpeg built with the encoder, the system ffmpeg is used if installed '
+                        'or set IMAGEIO_FFMPEG_EXE to the ffmpeg binary')
+    parser.add_argument('--bg_cache_gb',
+                        type=float,
+                        default=2,
+                        help='max size in GB of cached cropped background clips, 0 disables the cache')
+    parser.add_argument('--bg_cache_clips',
+                        type=int,
+                        default=3,
+                        help='number of cached clips cut from each background video, the cached clips are '
+                        'reused so more clips give more varied backgrounds')
+    parser.add_argument('--tts_cache_mb',
+                        type=float,
+                        default=500,
+                        help='max size in MB of cached generated audio, 0 disables the cache')
+    parser.add_argument('--renderer',
+                        default='moviepy',
+                        choices=RENDERERS,
+                        help='render video by compositing frames with moviepy or with a single ffmpeg call')
+    parser.add_argument('--decoder',
+                        default='moviepy',
+                        choices=DECODERS,
+                        help='decoder for the background video frames, pyav requires PyAV (moviepy renderer only)')
+    parser.add_argument('--font_file',
+                        default=None,
+                        help='font file used for the text overlays (default: calibrib.ttf)')
 
     return parser
 
 
-def generate_advice_tiktok_video(args: Namespace) -> NoReturn:
-    '''Given the script arguments, generate both the audio and video
-    for TikTok for each post in the json provided. The output files are
-    stored in the output folder within a folder named advice_<datetime>_#.
+def _print_error(msg: str, err: Exception) -> NoReturn:
+    '''Print the provided exception with a message describing where it was raised.
+
+    :param msg: message describing where exception was raised
+    :param err: exception raised
+    '''
+    print('---------------------------------------------------')
+    print(msg)
+    print(f'Err Type: {str(type(err))}')
+    print(f'Err Msg: {str(err)}')
+    print('---------------------------------------------------')
+
+
+def _split_between_workers(total: int, max_workers: int) -> int:
+    '''Split a thread/ request budget between the process pool workers, so the workers
+    together use the budget instead of each worker using all of it.
+
+    :param total: budget shared by all workers
+    :param max_workers: number of process pool workers
+    :return: budget of a single worker (at least 1)
+    '''
+    return max(1, total // max(1, max_workers))
 
+
+def _init_worker(renderer: str, worker_threads: int) -> NoReturn:
+    '''Initializer for the process pool workers. Limits numba to the worker's share of the cpu
+    and pre-loads moviepy when it's the renderer so the import cost is paid once when the worker
+    starts instead of inside the first post.
+
+    :param renderer: renderer the workers use, see VideoGenerator
+    :param worker_threads: threads a single worker can use
+    '''
+    # pylint: disable=import-outside-toplevel,unused-import
+    limit_worker_threads(worker_threads)
+    if renderer == 'moviepy':
+        import moviepy.video.io.VideoFileClip
+        import lib.compositing
+
+
+def _process_one(i: int,
+                 advice_post: Dict[str, str],
+                 args: Namespace,
+                 folder_prefix: str) -> NoReturn:
+    '''Generate both the audio and video for a single advice post. The function
+    is run within a process pool worker, the Audio & Video generators are
+    only created once per worker and reused across the posts it generates.
+
+    :param i: index of the post within the reddit json
+    :param advice_post: reddit submission data generated by ContentGeneration
     :param args: arguments passed to script
+    :param folder_prefix: output folder name prefix (type & datetime of the script run)
     '''
-    try:
-        now = datetime.now()
-        audio_gen = AudioGenerator()
-        video_gen = VideoGenerator(args.background_folder)
+    output_folder = join(args.output_folder, folder_prefix + str(i))
 
-        with open(args.reddit_json, 'r') as json_file:
-            advice_contents = json.load(json_file)
+    # each worker uses its share of the cpu for encoding / ffmpeg & of the gTTS requests
+    worker_threads = _split_between_workers(cpu_count() or 1, args.max_workers)
 
-        for i, advice_post in enumerate(advice_contents):
-            output_folder = join(args.output_folder,
-                                 f'advice_{now.day}{now.month}{now.year}_{now.hour}{now.minute}_{i}')
+    try:
+        video_gen = get_video_generator(args.background_folder,
+                                        hwaccel=args.hwaccel,
+                                        bg_cache_gb=args.bg_cache_gb,
+                                        bg_cache_clips=args.bg_cache_clips,
+                                        renderer=args.renderer,
+                                        font_file=args.font_file,
+                                        decoder=args.decoder,
+                                        encoder_threads=worker_threads)
+        tts_requests = _split_between_workers(MAX_TTS_REQUESTS, args.max_workers)
+        audio_gen = get_audio_generator(max_workers=tts_requests,
+                                        ffmpeg_workers=worker_threads,
+                                        cache_mb=args.tts_cache_mb)
+
+        audio_info = audio_gen.generate_audio_from_advice_submission(output_folder,
+                                                                     advice_post)
+
+        video_gen.generate_video_from_advice_submission(audio_info,
+                                                        output_folder,
+                                                        char_count=args.char_count,
+                                                        max_vid_length=args.max_vid_length)
+
+        print(f'Successfully Generated Advice Video for {i+1} post.')
+
+    except Exception as err:  # pylint: disable=broad-except
+        # a failing post is reported and skipped, the remaining posts are still generated
+        _print_error(f'Exception was raised while generating the video for {i+1} post', err)
 
-            audio_info = audio_gen.generate_audio_from_advice_submission(output_folder,
-                                                                         advice_post)
 
-            video_gen.generate_video_from_advice_submission(audio_info,
-                                                            output_folder,
-                                                            char_count=args.char_count,
-                                                            max_vid_length=args.max_vid_length)
+def generate_advice_tiktok_video(args: Namespace) -> NoReturn:
+    '''Given the script arguments, generate both the audio and video
+    for TikTok for each post in the json provided. The output files are
+    stored in the output folder within a folder named advice_<datetime>_#.
+    Posts are independent of each other and are generated in parallel.
 
-            print(f'Successfully Generated Advice Video for {i+1} post.')
+    :param args: arguments passed to script
+    '''
+    now = datetime.now()
+    # only the post index changes between output folders
+    folder_prefix = f'advice_{now.day}{now.month}{now.year}_{now.hour}{now.minute}_'
 
-    except Exception as err:
-        print('---------------------------------------------------')
-        print('Exception was raised during the execution of script')
-        print(f'Err Type: {str(type(err))}')
-        print(f'Err Msg: {str(err)}')
-        print('---------------------------------------------------')
+    try:
+        with open(args.reddit_json, 'rb') as json_file:
+            advice_contents = orjson.loads(json_file.read())
+    except (OSError, orjson.JSONDecodeError) as err:
+        _print_error('Exception was raised while loading the reddit json', err)
+        return
+
+    # a forced hardware encoder is checked once, instead of failing every post within the workers
+    if args.hwaccel in HW_ENCODERS:
+        try:
+            select_video_encoder(args.hwaccel)
+        except ValueError as err:
+            _print_error('Exception was raised while checking the hardware encoder', err)
+            return
+
+    # each worker uses its share of the cpu for compositing
+    worker_threads = _split_between_workers(cpu_count() or 1, args.max_workers)
+    # errors are handled per post within the workers
+    with ProcessPoolExecutor(max_workers=args.max_workers,
+                             initializer=_init_worker,
+                             initargs=(args.renderer, worker_threads)) as executor:
+        list(executor.map(_process_one,
+                          range(len(advice_contents)),
+                          advice_contents,
+                          repeat(args),
+                          repeat(folder_prefix)))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,215 @@
+'''Compositing & decoding for the moviepy renderer, only imported when a video is composited with moviepy'''
+from typing import List, NoReturn, Optional, Tuple
+from moviepy.audio.io.AudioFileClip import AudioFileClip
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.video.io.VideoFileClip import VideoFileClip
+from moviepy.video.VideoClip import VideoClip
+import numpy as np
+
+try:
+    import av
+except ImportError:
+    # PyAV is optional, only needed for the pyav decoder
+    av = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    # numba is optional, moviepy's compositing is used without it
+    njit = None
+
+
+def to_uint8(frame: np.ndarray) -> np.ndarray:
+    '''Convert a frame to uint8 (no copy if its already uint8).
+
+    :param frame: rgb frame
+    :return: uint8 rgb frame
+    '''
+    return frame.astype(np.uint8, copy=False)
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _blend(frame: np.ndarray,
+               overlay_rgb: np.ndarray,
+               overlay_alpha: np.ndarray,
+               x_pos: int,
+               y_pos: int) -> NoReturn:
+        '''Alpha blend the overlay onto the frame in place, using fixed point math.
+        Parts of the overlay outside of the frame are skipped.
+
+        :param frame: (H, W, 3) uint8 frame
+        :param overlay_rgb: (h, w, 3) uint8 overlay colors
+        :param overlay_alpha: (h, w) uint8 overlay alpha
+        :param x_pos: x position of the overlay's left edge in the frame
+        :param y_pos: y position of the overlay's top edge in the frame
+        '''
+        frame_h, frame_w = frame.shape[0], frame.shape[1]
+        overlay_h, overlay_w = overlay_alpha.shape
+        for i in prange(max(0, -y_pos), min(overlay_h, frame_h - y_pos)):
+            for j in range(max(0, -x_pos), min(overlay_w, frame_w - x_pos)):
+                alpha = np.uint16(overlay_alpha[i, j])
+                if alpha == 0:
+                    continue
+                for k in range(3):
+                    frame[y_pos + i, x_pos + j, k] = np.uint8(
+                        (np.uint16(overlay_rgb[i, j, k]) * alpha +
+                         np.uint16(frame[y_pos + i, x_pos + j, k]) * (255 - alpha) + 127) // 255)
+
+    class FastComposite(CompositeVideoClip):
+        '''CompositeVideoClip for a full frame background clip with overlays on top. Image overlays
+        are converted to uint8 rgb & alpha once and blended with a jit compiled loop instead of
+        moviepy's per frame float blit, other overlays are blitted by moviepy. The first clip covers
+        the whole frame, so the composite has no mask.'''
+
+        def __init__(self, clips: List[VideoFileClip], size: Optional[Tuple[int, int]] = None):
+            '''Initialize the composite of the background clip and the overlays.
+
+            :param clips: background clip followed by the overlay clips
+            :param size: size of the composite (default: size of background clip)
+            '''
+            super().__init__(clips, size=size)
+            self.mask = None
+
+            # image overlays are constant, (rgb, alpha) is computed once per overlay
+            self._overlay_arrays = {}
+            for clip in self.clips[1:]:
+                if getattr(clip, 'img', None) is not None and clip.mask is not None:
+                    self._overlay_arrays[id(clip)] = (
+                        np.ascontiguousarray(clip.img[:, :, :3], dtype=np.uint8),
+                        np.ascontiguousarray(np.round(clip.mask.img * 255), dtype=np.uint8))
+
+            self.make_frame = self._make_fast_frame
+
+        def _overlay_position(self, clip, clip_time: float) -> Optional[Tuple[int, int]]:
+            '''Get the top left position of an overlay, using moviepy's position rules.
+
+            :param clip: overlay clip
+            :param clip_time: time within the overlay clip
+            :return: (x, y) position or None if the position isnt absolute/centered
+            '''
+            if clip.relative_pos:
+                return None
+            pos = clip.pos(clip_time)
+            if isinstance(pos, str) or len(pos) != 2:
+                return None
+
+            frame_w, frame_h = self.size
+            overlay_w, overlay_h = clip.size
+            x_pos, y_pos = pos
+            if x_pos == 'center':
+                x_pos = (frame_w - overlay_w) / 2
+            if y_pos == 'center':
+                y_pos = (frame_h - overlay_h) / 2
+            if isinstance(x_pos, str) or isinstance(y_pos, str):
+                return None
+
+            return int(x_pos), int(y_pos)
+
+        def _make_fast_frame(self, t: float) -> np.ndarray:
+            '''Get the composited frame at time t.
+
+            :param t: timestamp in seconds
+            :return: (H, W, 3) uint8 frame
+            '''
+            frame = np.array(self.clips[0].get_frame(t), dtype=np.uint8)
+
+            for clip in self.playing_clips(t):
+                # background is already in the frame
+                if clip is self.clips[0]:
+                    continue
+                clip_time = t - clip.start
+                overlay_arrays = self._overlay_arrays.get(id(clip))
+                position = self._overlay_position(clip, clip_time)
+                if overlay_arrays is None or position is None:
+                    frame = clip.blit_on(frame, t).astype(np.uint8)
+                else:
+                    _blend(frame, *overlay_arrays, *position)
+
+            return frame
+
+    CompositeClip = FastComposite
+else:
+    class CompositeClip(CompositeVideoClip):
+        '''CompositeVideoClip that returns uint8 frames, moviepy's blit returns float64
+        frames which are 8x larger to pass on to the next composite & the writer.'''
+
+        def __init__(self, clips: List[VideoFileClip], size: Optional[Tuple[int, int]] = None):
+            '''Initialize the composite of the clips.
+
+            :param clips: clips to composite, see CompositeVideoClip
+            :param size: size of the composite (default: size of first clip)
+            '''
+            super().__init__(clips, size=size)
+            make_float_frame = self.make_frame
+            self.make_frame = lambda t: to_uint8(make_float_frame(t))
+
+
+class PyAVVideoClip(VideoClip):
+    '''Video clip decoded with PyAV (libav) in process, instead of moviepy reading raw frames
+    from an ffmpeg subprocess pipe. Frames are decoded in order as they're requested, the video
+    is only seeked when an earlier frame is requested. Frames are uint8 rgb.'''
+
+    def __init__(self, video_filepath: str):
+        '''Open the video file for decoding, the audio (if any) is loaded with moviepy.
+
+        :param video_filepath: filepath to video file
+        '''
+        super().__init__()
+        self._container = av.open(video_filepath)
+        self._stream = self._container.streams.video[0]
+        self._stream.thread_type = 'AUTO'
+
+        self.fps = float(self._stream.average_rate)
+        self.size = (self._stream.codec_context.width, self._stream.codec_context.height)
+        if self._stream.duration is not None:
+            duration = float(self._stream.duration * self._stream.time_base)
+        else:
+            duration = self._container.duration / av.time_base
+        self.duration = self.end = duration
+
+        # decoded frame at or before the last requested time & the frame after it
+        self._decoded_frames = None
+        self._frame = None
+        self._next_frame = None
+        self._frame_array = None
+        self.make_frame = self._read_frame
+
+        if self._container.streams.audio:
+            self.audio = AudioFileClip(video_filepath)
+
+    def _seek(self, t: float) -> NoReturn:
+        '''Seek to the keyframe at or before time t and restart decoding from it.
+
+        :param t: timestamp in seconds
+        '''
+        self._container.seek(int(t / self._stream.time_base), stream=self._stream)
+        self._decoded_frames = self._container.decode(self._stream)
+        self._frame = next(self._decoded_frames, None)
+        self._next_frame = next(self._decoded_frames, None)
+        self._frame_array = None
+
+    def _read_frame(self, t: float) -> np.ndarray:
+        '''Get the frame shown at time t, the last frame is returned past the end of the video.
+
+        :param t: timestamp in seconds
+        :return: (H, W, 3) uint8 frame
+        '''
+        if self._frame is None or t < self._frame.time:
+            self._seek(t)
+
+        # half a frame of tolerance, the frame times are rounded to the stream time base
+        while self._next_frame is not None and self._next_frame.time <= t + 0.5 / self.fps:
+            self._frame = self._next_frame
+            self._next_frame = next(self._decoded_frames, None)
+            self._frame_array = None
+
+        if self._frame_array is None:
+            self._frame_array = self._frame.to_ndarray(format='rgb24')
+        return self._frame_array
+
+    def close(self) -> NoReturn:
+        '''Close the video file & the audio reader.'''
+        self._container.close()
+        if self.audio is not None:
+            self.audio.close()
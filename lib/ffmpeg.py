@@ -0,0 +1,21 @@
+'''ffmpeg binary shared by the audio & video generators'''
+import os
+from shutil import which
+from imageio_ffmpeg import get_ffmpeg_exe
+
+
+def find_ffmpeg() -> str:
+    '''Find the ffmpeg binary used to convert the audio & encode the videos. IMAGEIO_FFMPEG_EXE is
+    used if it's set, otherwise the system ffmpeg on the PATH is preferred over imageio-ffmpeg's
+    bundled build, the bundled build has none of the hardware encoders.
+
+    :return: filepath to ffmpeg binary
+    '''
+    if os.getenv('IMAGEIO_FFMPEG_EXE'):
+        return get_ffmpeg_exe()
+    return which('ffmpeg') or get_ffmpeg_exe()
+
+
+# ffmpeg binary resolved once, moviepy is set to use the same binary (unless FFMPEG_BINARY is set)
+FFMPEG = find_ffmpeg()
+os.environ.setdefault('FFMPEG_BINARY', FFMPEG)
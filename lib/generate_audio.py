@@ -1,11 +1,33 @@
 '''Audio Generator Class module to generate audio from Reddit posts.'''
 from typing import Dict, Union, List, NoReturn, Tuple
+import asyncio
+from base64 import b64decode
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import hashlib
+from io import BytesIO
+import os
+from os import cpu_count, getpid, makedirs, replace, scandir
 from os.path import join
 from pathlib import Path
 import re
-from textwrap import wrap
-from gtts import gTTS
-from moviepy.editor import *
+import shutil
+import subprocess
+from gtts import gTTS, gTTSError
+import requests
+from requests.adapters import HTTPAdapter
+
+from lib.ffmpeg import FFMPEG
+
+# censored words are replaced by better_profanity with "****"
+_MULTI_STAR = re.compile(r'\*{2,}')
+_SINGLE_STAR = re.compile(r'\*')
+# translation table used to strip newlines from postbody text
+_STRIP_NEWLINES = str.maketrans('', '', '\r\n')
+# gTTS requests sent at the same time by default, more gets the requests rate limited
+MAX_TTS_REQUESTS = 8
+# base64 mp3 within the gTTS API response, same pattern gTTS uses
+_TTS_AUDIO = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
 
 
 class AudioGenerator:
@@ -13,12 +35,36 @@ class AudioGenerator:
     them locally in provided output folder under a newly created audio folder.
     The audio clips are generated using gTTS and are stored within a newly
     created folder within the output folder. Comments are stored in a sub folder
-    within the audio folder.
+    within the audio folder. Generated audio is also stored in a content addressed
+    cache so repeated text is not sent to gTTS again.
     '''
+    # cache of generated audio shared across runs, files are named by the hash of
+    # the sanitized text, accent and multiplier used to generate them. least recently
+    # used audio is removed once the cache is over cache_mb
+    _cache_dir = Path.home() / '.cache' / 'tiktok_tts'
+
+    def __init__(self,
+                 max_workers: int = MAX_TTS_REQUESTS,
+                 ffmpeg_workers: int = 0,
+                 cache_mb: float = 500):
+        '''Initialize the AudioGenerator class for use.
+
+        :param max_workers: number of text chunks to generate audio for concurrently (default: 8).
+                            each chunk is a gTTS request & ffmpeg call, so the work is I/O bound
+        :param ffmpeg_workers: number of ffmpeg calls run at the same time, 0 uses the cpu count (default: 0)
+        :param cache_mb: max size in MB of the generated audio cache, 0 disables the cache (default: 500)
+        '''
+        self.max_workers = max_workers
+        self.ffmpeg_workers = ffmpeg_workers or cpu_count() or 1
+        self.cache_mb = cache_mb
+        # gTTS opens a new session (TCP + TLS handshake) for every request, a single
+        # session is shared instead so requests reuse the pooled connections
+        self._session = requests.Session()
+        self._session.mount('https://', HTTPAdapter(pool_maxsize=max_workers))
 
     def create_audio_folder_struct(self, base_dir: str) -> Dict[str, str]:
         '''Function creates the folder structure needed for generate_audio_from_submission
-        to correctly store the mp3 files generated.
+        to correctly store the wav files generated.
         Folder generated:
         <base_dir>/audio
         <base_dir>/audio/postbody
@@ -31,9 +77,9 @@ class AudioGenerator:
         postbody_dir = join(audio_dir, 'postbody')
         comments_dir = join(audio_dir, 'comments')
 
-        Path(audio_dir).mkdir(parents=True, exist_ok=True)
-        Path(postbody_dir).mkdir(parents=True, exist_ok=True)
-        Path(comments_dir).mkdir(parents=True,  exist_ok=True)
+        # audio_dir is created as the parent of both sub folders
+        makedirs(postbody_dir, exist_ok=True)
+        makedirs(comments_dir, exist_ok=True)
 
         return {
             'audio_dir': audio_dir,
@@ -46,12 +92,40 @@ class AudioGenerator:
                                        char_in_chunk: int = 300) -> List[str]:
         '''Given an arbitrary long reddit postbody. Split into smaller text chunks
         with each chunk have at most <char_in_chunk> characters. All \n are also
-        removed from text.
-
-        :return: list of strings with each string at most char_in_chunk words
+        removed from text. Chunks are split on the last space within the limit, words
+        longer than the limit are kept whole. Unlike textwrap.wrap, chunks are only split
+        on spaces, hyphenated words are never split.
+
+        :param postbody: reddit postbody text
+        :param char_in_chunk: max characters in a chunk (default: 300)
+        :return: list of strings with each string at most char_in_chunk characters
+                 (unless its a single longer word)
         '''
-        postbody = postbody.replace('\r', '').replace('\n', '')
-        text_list = wrap(postbody, char_in_chunk, break_long_words=False)
+        postbody = postbody.translate(_STRIP_NEWLINES)
+        text_list = []
+
+        start = 0
+        postbody_len = len(postbody)
+        while start < postbody_len:
+            # chunks never start with a space
+            if postbody[start] == ' ':
+                start += 1
+                continue
+
+            end = start + char_in_chunk
+            if end < postbody_len:
+                # split on the last space that keeps the chunk within the limit
+                split_idx = postbody.rfind(' ', start, end + 1)
+                if split_idx <= start:
+                    # no space within limit, keep the long word whole
+                    split_idx = postbody.find(' ', end)
+                end = split_idx if split_idx != -1 else postbody_len
+
+            chunk = postbody[start:end].strip()
+            if chunk:
+                text_list.append(chunk)
+            # skip the space the chunk was split on
+            start = end + 1
 
         return text_list
 
@@ -64,8 +138,201 @@ class AudioGenerator:
         :param censored_sentence: sentence that might contain censored words
         :return: sentence with censored words as "beep" and removed * instances
         '''
-        beeped_sentence = re.sub('[\\*]{2,}', 'beep', censored_sentence)
-        return re.sub('[\\*]{1}', '', beeped_sentence)
+        # most text (i.e. advice postbodies) contains no censored words
+        if '*' not in censored_sentence:
+            return censored_sentence
+
+        return _SINGLE_STAR.sub('', _MULTI_STAR.sub('beep', censored_sentence))
+
+    def _request_tts(self, recording: gTTS) -> bytes:
+        '''Send the gTTS API request(s) for the recording using the shared session
+        and return the mp3 audio. Mirrors gTTS.stream, which creates a new session
+        for every request.
+
+        :param recording: gTTS instance of the text to record
+        :return: mp3 bytes of the recording
+        :raises: gTTSError (if API request fails or response contains no audio)
+        '''
+        mp3_buffer = BytesIO()
+        # gTTS splits long text into multiple requests, audio parts are concatenated
+        for prepared_request in recording._prepare_requests():  # pylint: disable=protected-access
+            try:
+                response = self._session.send(prepared_request)
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as err:
+                raise gTTSError(tts=recording, response=response) from err
+            except requests.exceptions.RequestException as err:
+                raise gTTSError(tts=recording) from err
+
+            for line in response.iter_lines(chunk_size=1024):
+                decoded_line = line.decode('utf-8')
+                if recording.GOOGLE_TTS_RPC in decoded_line:
+                    audio_search = _TTS_AUDIO.search(decoded_line)
+                    if not audio_search:
+                        # successful response but no audio within response
+                        raise gTTSError(tts=recording, response=response)
+                    mp3_buffer.write(b64decode(audio_search.group(1)))
+
+        return mp3_buffer.getvalue()
+
+    def _get_cache_key(self, sanitized_text: str, audio_accent: str, multiplier: float) -> str:
+        '''Get the audio cache key for the provided gTTS settings.
+
+        :param sanitized_text: text sent to gTTS
+        :param audio_accent: tld used for gTTS
+        :param multiplier: multiplier used to speed up or slowdown audio
+        :return: hash of the audio cache entry
+        '''
+        return hashlib.sha256(f'{sanitized_text}|{audio_accent}|{multiplier}'.encode()).hexdigest()
+
+    def _copy_from_cache(self, cache_key: str, audio_filepath: str) -> bool:
+        '''Copy the cached audio for the cache key to the audio filepath if it exists.
+
+        :param cache_key: hash of the audio cache entry
+        :param audio_filepath: filepath to copy the cached audio to
+        :return: True if the cached audio existed and was copied
+        '''
+        if self.cache_mb <= 0:
+            return False
+
+        cached_filepath = self._cache_dir / f'{cache_key}.wav'
+        try:
+            # mark audio as most recently used
+            os.utime(cached_filepath)
+            shutil.copy(cached_filepath, audio_filepath)
+        except FileNotFoundError:
+            # not cached (or evicted by another process)
+            return False
+        return True
+
+    def _store_in_cache(self, cache_key: str, audio_filepath: str) -> NoReturn:
+        '''Store the generated audio in the cache. The audio is written to a temp
+        file first so other processes never copy a partially written cache entry.
+
+        :param cache_key: hash of the audio cache entry
+        :param audio_filepath: filepath of the generated audio
+        '''
+        if self.cache_mb <= 0:
+            return
+
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_cache_filepath = self._cache_dir / f'{cache_key}.{getpid()}.tmp'
+        shutil.copy(audio_filepath, temp_cache_filepath)
+        replace(temp_cache_filepath, self._cache_dir / f'{cache_key}.wav')
+        self._evict_cache()
+
+    def _evict_cache(self) -> NoReturn:
+        '''Remove the least recently used audio from the cache until the cache is within cache_mb.'''
+        cache_limit = self.cache_mb * 1024 ** 2
+        cached_audios = [(entry.path, entry.stat()) for entry in scandir(self._cache_dir)
+                         if entry.name.endswith('.wav')]
+        # most recently used first
+        cached_audios.sort(key=lambda audio: audio[1].st_mtime, reverse=True)
+
+        cache_size = 0
+        for audio_filepath, audio_stat in cached_audios:
+            cache_size += audio_stat.st_size
+            if cache_size > cache_limit:
+                Path(audio_filepath).unlink(missing_ok=True)
+
+    async def _generate_one(self,
+                            text: str,
+                            output_filepath: str,
+                            filename: str,
+                            audio_accent: str,
+                            multiplier: float,
+                            executor: ThreadPoolExecutor,
+                            ffmpeg_slots: asyncio.Semaphore,
+                            cache_locks: Dict[str, asyncio.Lock]) -> str:
+        '''Generate audio for the provided text and store it in the output_filepath. The
+        gTTS request is sent on the executor while the ffmpeg encode runs as an async
+        subprocess, so the request for the next text overlaps with the encode of this one.
+
+        :param text: text to read using gTTS
+        :param output_filepath: file path to store the generated audio
+        :param filename: filename of the generated audio
+        :param audio_accent: tld to use for gTTS to change accent of audio
+        :param multiplier: multiplier used to speed up or slowdown audio
+        :param executor: thread pool used to send the (blocking) gTTS requests
+        :param ffmpeg_slots: semaphore limiting the number of concurrent ffmpeg processes
+        :param cache_locks: per cache key locks so texts with the same audio only generate once
+        :return: filepath to the finalized audio recording
+        '''
+        audio_filepath = join(output_filepath, filename)
+
+        sanitized_text = self.sanitize_sentence_for_gtts(text)
+        cache_key = self._get_cache_key(sanitized_text, audio_accent, multiplier)
+
+        async with cache_locks.setdefault(cache_key, asyncio.Lock()):
+            if self._copy_from_cache(cache_key, audio_filepath):
+                return audio_filepath
+
+            # generate audio using gTTS, stored in memory instead of a temp file
+            recording = gTTS(sanitized_text, tld=audio_accent)
+            mp3_audio = await asyncio.get_running_loop().run_in_executor(executor,
+                                                                         self._request_tts,
+                                                                         recording)
+
+            # speed up the audio using ffmpeg (reading the mp3 from stdin) and store in final output
+            # as PCM wav, the audio is only re-encoded once when it is muxed into the video
+            ffmpeg_cmd = [FFMPEG, '-y',
+                          '-hide_banner', '-loglevel', 'error',
+                          '-i', 'pipe:0',
+                          '-filter:a', f'atempo={multiplier}',
+                          '-c:a', 'pcm_s16le',
+                          '-f', 'wav', audio_filepath]
+            async with ffmpeg_slots:
+                process = await asyncio.create_subprocess_exec(*ffmpeg_cmd,
+                                                               stdin=asyncio.subprocess.PIPE,
+                                                               stderr=asyncio.subprocess.PIPE)
+                _, ffmpeg_err = await process.communicate(mp3_audio)
+            if process.returncode:
+                raise subprocess.CalledProcessError(process.returncode, ffmpeg_cmd, stderr=ffmpeg_err)
+
+            self._store_in_cache(cache_key, audio_filepath)
+
+        return audio_filepath
+
+    async def _generate_many(self,
+                             jobs: List[Tuple[str, str, str]],
+                             audio_accent: str,
+                             multiplier: float) -> List[str]:
+        '''Generate the audio for all jobs concurrently, see generate_audio_files.
+
+        :param jobs: list of (text, output_filepath, filename) to generate audio for
+        :param audio_accent: tld to use for gTTS to change accent of audio
+        :param multiplier: multiplier used to speed up or slowdown audio
+        :return: filepaths to the finalized audio recordings, in the same order as jobs
+        '''
+        ffmpeg_slots = asyncio.Semaphore(self.ffmpeg_workers)
+        cache_locks = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return await asyncio.gather(*[self._generate_one(text,
+                                                             output_filepath,
+                                                             filename,
+                                                             audio_accent,
+                                                             multiplier,
+                                                             executor,
+                                                             ffmpeg_slots,
+                                                             cache_locks)
+                                          for text, output_filepath, filename in jobs])
+
+    def generate_audio_files(self,
+                             jobs: List[Tuple[str, str, str]],
+                             audio_accent: str = 'com',
+                             multiplier: float = 1.25) -> List[str]:
+        '''Generate audio for each of the provided jobs and store them locally. The jobs
+        are run as a pipeline, gTTS requests are sent concurrently (up to max_workers) and
+        each audio is piped into ffmpeg to apply the speed multiplier as soon as it is received.
+        Texts previously generated with the same settings are copied from the cache instead.
+
+        :param jobs: list of (text, output_filepath, filename) to generate audio for
+        :param audio_accent: tld to use for gTTS to change accent of audio (default: com)
+        :param multiplier: multiplier used to speed up or slowdown audio
+        :return: filepaths to the finalized audio recordings, in the same order as jobs
+        '''
+        return asyncio.run(self._generate_many(jobs, audio_accent, multiplier))
 
     def generate_audio_and_save(self,
                                 text: str,
@@ -74,7 +341,10 @@ class AudioGenerator:
                                 audio_accent: str = 'com',
                                 multiplier: float = 1.25) -> str:
         '''Generate audio for the provided text and store the generated audio
-        locally in the provided output_filepath.
+        locally in the provided output_filepath as wav. The gTTS mp3 is kept in memory and
+        piped directly into ffmpeg to apply the speed multiplier in a single decode.
+        If the same text was previously generated with the same settings, the cached
+        audio is copied instead.
 
         :param text: text to read using gTTS
         :param output_filepath: file path to store the generated audio
@@ -82,33 +352,16 @@ class AudioGenerator:
         :param multiplier: multiplier used to speed up or slowdown audio
         :return: filepath to the finalized audio recording
         '''
-        temp_filepath = join(output_filepath, 'temp.mp3')
-        audio_filepath = join(output_filepath, filename)
-
-        sanitized_text = self.sanitize_sentence_for_gtts(text)
-        # generate audio using gTTS
-        recording = gTTS(sanitized_text, tld=audio_accent)
-        # create temp stored audiofile
-        recording.save(temp_filepath)
-
-        # speed up the audio using moviepy and store in final output
-        audio = AudioFileClip(temp_filepath)
-        audio.write_audiofile(audio_filepath,
-                              ffmpeg_params=["-filter:a",
-                                             f"atempo={multiplier}"])
-        audio.close()
-
-        # remove temp mp3
-        Path(temp_filepath).unlink(missing_ok=True)
-
-        return audio_filepath
+        return self.generate_audio_files([(text, output_filepath, filename)],
+                                         audio_accent=audio_accent,
+                                         multiplier=multiplier)[0]
 
     def generate_audio_from_advice_submission(self,
                                               base_output_path,
                                               submission: Dict[str, str]) -> Dict[str, Dict[str, str]]:
         '''Function generates audio recordings using the provided advice style submission data.
-        The function stores audio files as mp3s within the output_folder. The file names are 
-        defaulted to ['title.mp3', 'body_#.mp3']. The output folder is used to created a subfolder
+        The function stores audio files as wavs within the output_folder. The file names are 
+        defaulted to ['title.wav', 'postbody_#.wav']. The output folder is used to created a subfolder
         for audio where all files are stored.
 
         :param base_output_path: folder path to store generate audio.
@@ -123,24 +376,23 @@ class AudioGenerator:
         # generate default set of directory needed to store audio files
         audio_dir_dict = self.create_audio_folder_struct(base_output_path)
 
-        # generate the audio file
-        title_path = self.generate_audio_and_save(submission_title,
-                                                  audio_dir_dict['audio_dir'],
-                                                  'title.mp3')
+        postbody_list = self.split_post_body_into_text_list(submission_body)
+
+        # title and chunks are independent, generate all the audio files concurrently
+        # (filepaths are returned in the same order as the jobs)
+        audio_jobs = [(submission_title, audio_dir_dict['audio_dir'], 'title.wav')]
+        audio_jobs += [(chunk, audio_dir_dict['postbody_dir'], f'postbody_{i}.wav')
+                       for i, chunk in enumerate(postbody_list)]
+        title_path, *postbody_filepaths = self.generate_audio_files(audio_jobs)
+
         # store text and filename
         audio_file_dict['title'] = {
             'text': submission_title,
             'audio_filepath': title_path,
         }
 
-        postbody_list = self.split_post_body_into_text_list(submission_body)
         postbody_audio_list = []
-
-        for i, chunk in enumerate(postbody_list):
-            # generate the audio file
-            postbody_filepath = self.generate_audio_and_save(chunk,
-                                                             audio_dir_dict['postbody_dir'],
-                                                             f'postbody_{i}.mp3')
+        for chunk, postbody_filepath in zip(postbody_list, postbody_filepaths):
             # store text and filename
             postbody_audio_list.append({
                 'text': chunk,
@@ -155,8 +407,8 @@ class AudioGenerator:
                                            base_output_path: str,
                                            submission: Dict[str, Union[str, List[str]]]) -> Dict[str, Dict]:
         '''Function generates audio recordings using the provided QnA tyle submission data. The function
-        stores audio files as mp3s within the output_folder. The file names are defaulted to
-        ['title.mp3', 'comment_#.mp3'].
+        stores audio files as wavs within the output_folder. The file names are defaulted to
+        ['title.wav', 'comment_#.wav'].
         The output folder is used to created a subfolder for audio where all files are stored.
 
         :param base_output_path: folder path to store generate audio.
@@ -169,10 +421,17 @@ class AudioGenerator:
 
         audio_dir_dict = self.create_audio_folder_struct(base_output_path)
 
-        # generate the audio file
-        title_path = self.generate_audio_and_save(submission_title,
-                                                  audio_dir_dict['audio_dir'],
-                                                  'title.mp3')
+        # keep the original comment index for the filename, skipping empty comments
+        comment_list = [(i, comment_dict['comment'])
+                        for i, comment_dict in enumerate(comments) if comment_dict['comment']]
+
+        # title and comments are independent, generate all the audio files concurrently
+        # (filepaths are returned in the same order as the jobs)
+        audio_jobs = [(submission_title, audio_dir_dict['audio_dir'], 'title.wav')]
+        audio_jobs += [(comment, audio_dir_dict['comments_dir'], f'comment_{i}.wav')
+                       for i, comment in comment_list]
+        title_path, *comment_filepaths = self.generate_audio_files(audio_jobs)
+
         # store text and filename
         audio_file_dict['title'] = {
             'text': submission_title,
@@ -180,18 +439,24 @@ class AudioGenerator:
         }
 
         comment_audio_list = []
-        for i, comment_dict in enumerate(comments):
-            if comment_dict['comment']:
-                # generate the audio file
-                comment_filepath = self.generate_audio_and_save(comment_dict['comment'],
-                                                                audio_dir_dict['comments_dir'],
-                                                                f'comment_{i}.mp3')
-                # store text, comment score and filename
-                comment_audio_list.append({
-                    'text': comment_dict['comment'],
-                    'audio_filepath': comment_filepath,
-                })
+        for (_, comment), comment_filepath in zip(comment_list, comment_filepaths):
+            # store text, comment score and filename
+            comment_audio_list.append({
+                'text': comment,
+                'audio_filepath': comment_filepath,
+            })
 
         audio_file_dict['comments'] = comment_audio_list
 
         return audio_file_dict
+
+
+@lru_cache(maxsize=4)
+def get_audio_generator(**kwargs) -> AudioGenerator:
+    '''Get an AudioGenerator with the provided options, instances are memoized so
+    repeated calls with the same options reuse the same generator.
+
+    :param kwargs: AudioGenerator options (i.e. max_workers)
+    :return: AudioGenerator instance
+    '''
+    return AudioGenerator(**kwargs)
@@ -2,12 +2,22 @@
 using PRAW to get top SubReddit posts based on post style.
 QnA - user asks reddit population a question and comments are aggregated on score limit
 Advice - user explains their situation and asks reddit population for advice'''
-from typing import Dict, Union, List
-import json
+from typing import Dict, Union, List, Pattern
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+import re
+import threading
 from uuid import uuid4
 import praw
 from better_profanity import profanity
 
+# better_profanity treats letters, digits and @$*"' as part of a word, censor words
+# must not be preceded or followed by any of them
+_NOT_AFTER_WORD = r'(?<![^\W_])(?<![@$*"\'])'
+_NOT_BEFORE_WORD = r'(?![^\W_])(?![@$*"\'])'
+# multi word censor entries can be separated by any non word characters
+_WORD_SEPARATOR = r'(?:(?![@$*"\'])[\W_])+'
+
 
 class ContentGenerator:
     '''Class based utility to query Reddit api for various subreddit
@@ -31,15 +41,72 @@ class ContentGenerator:
         :param password: reddit account password
         '''
 
-        self.client = praw.Reddit(
-            client_id=client_id,
-            client_secret=client_secret,
-            username=username,
-            password=password,
-            user_agent=f'automatedTikToks_{uuid4().hex}',
-        )
+        self._credentials = {
+            'client_id': client_id,
+            'client_secret': client_secret,
+            'username': username,
+            'password': password,
+            'user_agent': f'automatedTikToks_{uuid4().hex}',
+        }
+        self.client = praw.Reddit(**self._credentials)
+        # praw.Reddit isn't thread safe, the threads fetching posts each use their own client
+        self._thread_clients = threading.local()
         # load profanity censor
         profanity.load_censor_words()
+        self._profanity_re = self._compile_profanity_pattern()
+
+    @staticmethod
+    def _compile_profanity_pattern() -> Pattern:
+        '''Build a single regex matching all words within better_profanity's censor wordlist.
+        The character substitutions better_profanity checks for (i.e. "$" for "s") are
+        included as character classes so text is censored the same way in one regex pass.
+
+        :return: compiled regex matching censor words
+        '''
+        word_patterns = []
+        for censor_word in profanity.CENSOR_WORDSET:
+            word_pattern = ''
+            for char in str(censor_word):
+                if char == ' ':
+                    word_pattern += _WORD_SEPARATOR
+                else:
+                    char_variants = profanity.CHARS_MAPPING.get(char, (char,))
+                    word_pattern += f"[{''.join(map(re.escape, char_variants))}]"
+            word_patterns.append(word_pattern)
+
+        # longest first so multi word entries are matched before their first word
+        word_patterns.sort(key=len, reverse=True)
+
+        return re.compile(f"{_NOT_AFTER_WORD}(?:{'|'.join(word_patterns)}){_NOT_BEFORE_WORD}",
+                          re.IGNORECASE)
+
+    def _get_thread_client(self) -> praw.Reddit:
+        '''Get the PRAW client of the current thread, created on first use.
+
+        :return: PRAW client only used by the current thread
+        '''
+        client = getattr(self._thread_clients, 'client', None)
+        if client is None:
+            client = self._thread_clients.client = praw.Reddit(**self._credentials)
+        return client
+
+    def censor(self, text: str) -> str:
+        '''Replace censor words within the text with "****". Censor words are matched case
+        insensitively with better_profanity's character substitutions (i.e. "$" for "s") and
+        only as whole words, the words of multi word entries can be separated by any non word
+        characters. The output matches better_profanity's censor, except:
+
+        - entries with punctuation (i.e. "s.o.b.", "sh!+", "f-u-c-k") are censored whole, better_profanity
+          splits them into words so they're missed or only partly censored
+        - multi word entries are censored when the words are separated by tabs, newlines or
+          punctuation, better_profanity only matches the entry's own separator
+        - better_profanity also joins neighbouring words to match entries ("sh*t, a" as "shota"),
+          only the entry's own words are matched here
+
+        :param text: text to censor
+        :return: censored text
+        '''
+        return self._profanity_re.sub('****', text)
 
     def get_top_advice_posts(self,
                              sub_name: str = 'amitheasshole',
@@ -63,8 +130,8 @@ class ContentGenerator:
             post_selftext = submission.selftext
 
             top_posts.append({
-                'title': profanity.censor(post_title),
-                'postbody': profanity.censor(post_selftext),
+                'title': self.censor(post_title),
+                'postbody': self.censor(post_selftext),
             })
 
         return top_posts
@@ -76,7 +143,9 @@ class ContentGenerator:
                           comment_score_min: int = 1000,
                           comment_char_limit: int = 250,
                           comment_reply_threshold: int = 50,
-                          comment_sort: str = 'confidence') -> List[Dict[str, Union[str, List[str]]]]:
+                          comment_sort: str = 'confidence',
+                          fetch_more: bool = False,
+                          max_workers: int = 8) -> List[Dict[str, Union[str, List[str]]]]:
         '''Given a reddit subreddit name that is QnA format (comment answers), time filter and comment count,
         query reddit's api through the PRAW client and return the provided time filter's posts with the
         post's title & the top n (comment_count) comments.
@@ -91,28 +160,60 @@ class ContentGenerator:
         :param comment_reply_threshold: comment reply count threshold before being included in output (default: 50)
         :param comment_sort: sort order for comments, Can be one of "confidence",
                              "controversial", "new", "old", or "top" (default: "confidence")
+        :param fetch_more: expand "load more comments" stubs, each expansion is an extra API request.
+                           only top level comments are used, so stubs are dropped by default (default: False)
+        :param max_workers: number of posts to fetch comments for at once (default: 8)
         :return: List of dictionaries containing the subreddit's top post "title" and "comments" for provided time filter
         '''
         subreddit = self.client.subreddit(sub_name)
-        top_posts = []
-
-        for submission in subreddit.top(limit=post_limit, time_filter=time_filter):
-            post_title = profanity.censor(submission.title)
-            submission.comment_sort = comment_sort
-            submission.comments.replace_more(threshold=comment_reply_threshold)
-
-            comments = []
-            for top_level_comment in submission.comments:
-                if top_level_comment.score > comment_score_min and \
-                        len(top_level_comment.body) <= comment_char_limit:
-                    comments.append({
-                        'comment': profanity.censor(top_level_comment.body),
-                        'comment_score': top_level_comment.score,
-                    })
-
-            top_posts.append({
-                'title': post_title,
-                'comments': comments,
-            })
+        submissions = subreddit.top(limit=post_limit, time_filter=time_filter)
+
+        # each post's comments are a separate API request, posts are fetched concurrently
+        # so the requests overlap. map keeps the posts in the listing order
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            top_posts = list(executor.map(self._get_qna_post,
+                                          submissions,
+                                          repeat(comment_score_min),
+                                          repeat(comment_char_limit),
+                                          repeat(comment_reply_threshold),
+                                          repeat(comment_sort),
+                                          repeat(fetch_more)))
 
         return top_posts
+
+    def _get_qna_post(self,
+                      submission: praw.models.Submission,
+                      comment_score_min: int,
+                      comment_char_limit: int,
+                      comment_reply_threshold: int,
+                      comment_sort: str,
+                      fetch_more: bool) -> Dict[str, Union[str, List[str]]]:
+        '''Fetch the comments of a QnA post and return the post's title & the comments within
+        the score & char limits, see get_top_qna_posts for the comment params. The post is
+        re-created from its id with the thread's own client, so threads never share a client.
+
+        :param submission: PRAW submission of the post (from the top posts listing)
+        :return: dictionary containing the post "title" and "comments"
+        '''
+        post_title = self.censor(submission.title)
+        submission = self._get_thread_client().submission(id=submission.id)
+        submission.comment_sort = comment_sort
+        if fetch_more:
+            submission.comments.replace_more(threshold=comment_reply_threshold)
+        else:
+            # drop the MoreComments stubs without requesting them
+            submission.comments.replace_more(limit=0)
+
+        comments = []
+        for top_level_comment in submission.comments:
+            if top_level_comment.score > comment_score_min and \
+                    len(top_level_comment.body) <= comment_char_limit:
+                comments.append({
+                    'comment': self.censor(top_level_comment.body),
+                    'comment_score': top_level_comment.score,
+                })
+
+        return {
+            'title': post_title,
+            'comments': comments,
+        }
@@ -1,11 +1,327 @@
 '''Video Generator Class to create Tiktok style videos'''
-from typing import Dict, Union, List, NoReturn, Tuple
-from os import listdir
-from os.path import join
+# moviepy is imported where it's used, so the ffmpeg renderer never loads it
+# pylint: disable=import-outside-toplevel
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from typing import Dict, Union, List, NoReturn, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from glob import glob
+from hashlib import blake2b
+from importlib.util import find_spec
+import os
+from os import cpu_count, getpid, makedirs, replace, scandir
+from os.path import abspath, dirname, exists, join, splitext
 from pathlib import Path
 from random import choice, randrange
+import re
+import subprocess
+import sys
+from tempfile import mkstemp
 from textwrap import wrap
-from moviepy.editor import *  # recommended per moviepy Docs
+from time import time
+import wave
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from lib.ffmpeg import FFMPEG
+
+if TYPE_CHECKING:
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+
+try:
+    import fcntl
+except ImportError:
+    # windows, last used vid file isn't locked
+    fcntl = None
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    # threadpoolctl is optional, numpy's BLAS/OpenMP threads aren't limited in the batch workers
+    threadpool_limits = None
+
+
+# hardware encoders that can be used to write the finalized video
+# hwaccel name: (ffmpeg codec, preset, extra ffmpeg params)
+# h264_amf & h264_videotoolbox have no -preset, moviepy always passes one so it's set to the
+# quality for amf and ignored by videotoolbox
+HW_ENCODERS = {
+    'nvenc': ('h264_nvenc', 'p4', ['-tune', 'hq', '-rc', 'vbr', '-b:v', '6M']),
+    'hevc_nvenc': ('hevc_nvenc', 'p4', ['-tune', 'hq', '-rc', 'vbr', '-b:v', '6M']),
+    'qsv': ('h264_qsv', 'medium', ['-b:v', '6M']),
+    'amf': ('h264_amf', 'speed', ['-quality', 'speed', '-b:v', '6M']),
+    'videotoolbox': ('h264_videotoolbox', 'medium', ['-b:v', '6M']),
+}
+# order hardware encoders are tried in when hwaccel is auto
+AUTO_HW_ENCODERS = ['nvenc', 'qsv', 'amf', 'videotoolbox']
+# cpu encoder used when no hardware encoder is available or hwaccel is none
+CPU_ENCODER = ('libx264', 'medium', None)
+# (preset, extra ffmpeg params) of the cropped background clips, the clips are re-encoded when the
+# video is written so they're encoded at the fastest preset with high quality. encoders not listed
+# use the same settings as the finalized video
+INTERMEDIATE_ENCODER_SETTINGS = {
+    'libx264': ('ultrafast', ['-crf', '18']),
+    'h264_nvenc': ('p1', HW_ENCODERS['nvenc'][2]),
+    'hevc_nvenc': ('p1', HW_ENCODERS['hevc_nvenc'][2]),
+}
+
+# mp4 muxer params for the finalized video, fragmented mp4 is written as it's encoded
+# so there's no moov atom to rewrite (the stall after encoding) once the video is done
+MP4_MUX_PARAMS = ['-movflags', '+frag_keyframe+empty_moov', '-flush_packets', '0']
+
+# renderers that can composite the text & audio onto the background video
+RENDERERS = ['moviepy', 'ffmpeg']
+# decoders the moviepy renderer can read the background video with
+DECODERS = ['moviepy', 'pyav']
+# age in seconds after which a background cache temp file is left over from a killed process
+STALE_TEMP_AGE = 60 * 60
+
+# kinds of submissions generate_batch can generate videos for
+KINDS = ['qna', 'advice']
+
+# text overlay style shared by every text in the video
+# calibri bold, pass a path (--font_file) if its not in the system font folder
+TEXT_FONT = 'calibrib.ttf'
+TEXT_COLOR = 'white'
+TEXT_STROKE_COLOR = 'black'
+TEXT_STROKE_WIDTH = 2
+# comments & postbody texts are wrapped at more characters than the title (smaller font)
+TEXT_EXTRA_CHAR_COUNT = 8
+
+# drawing context used to measure text, text is only measured so it's shared by every text
+_MEASURE_DRAW = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+
+
+@lru_cache(maxsize=None)
+def encoder_available(hwaccel: str) -> bool:
+    '''Check whether the hardware encoder can be used on this machine. ffmpeg lists
+    encoders it was built with even if there is no supported hardware, so a single
+    blank frame is encoded with the encoder settings instead. Result is cached.
+
+    :param hwaccel: hardware encoder name (key of HW_ENCODERS)
+    :return: True if the encoder successfully encoded a test frame
+    '''
+    codec, preset, ffmpeg_params = HW_ENCODERS[hwaccel]
+    result = subprocess.run([FFMPEG, '-hide_banner', '-loglevel', 'error',
+                             '-f', 'lavfi', '-i', 'color=size=256x256:duration=0.1',
+                             '-frames:v', '1',
+                             '-c:v', codec, '-preset', preset, *ffmpeg_params,
+                             '-f', 'null', '-'],
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL,
+                            check=False)
+    return result.returncode == 0
+
+
+def select_video_encoder(hwaccel: str = 'auto') -> Tuple[str, str, Optional[List[str]]]:
+    '''Select the video encoder used to write the finalized video.
+
+    :param hwaccel: "auto" to use the first available hardware encoder, "none" for cpu
+                    encoding (libx264) or a key of HW_ENCODERS to force an encoder (default: auto)
+    :return: tuple of ffmpeg codec, preset and extra ffmpeg params for the encoder
+    :raises: ValueError (if a forced hardware encoder isn't available)
+    '''
+    if hwaccel == 'none':
+        return CPU_ENCODER
+
+    if hwaccel == 'auto':
+        for maybe_hwaccel in AUTO_HW_ENCODERS:
+            if encoder_available(maybe_hwaccel):
+                return HW_ENCODERS[maybe_hwaccel]
+        return CPU_ENCODER
+
+    if not encoder_available(hwaccel):
+        raise ValueError(f'The {hwaccel} encoder ({HW_ENCODERS[hwaccel][0]}) is not available with {FFMPEG}, '
+                         'it needs a supported gpu & an ffmpeg built with the encoder (see IMAGEIO_FFMPEG_EXE)')
+    return HW_ENCODERS[hwaccel]
+
+
+def select_intermediate_encoder(hwaccel: str = 'auto') -> Tuple[str, str, Optional[List[str]]]:
+    '''Select the video encoder used to write the cropped background clips, same encoder as
+    select_video_encoder with the settings in INTERMEDIATE_ENCODER_SETTINGS.
+
+    :param hwaccel: hardware encoder, see select_video_encoder (default: auto)
+    :return: tuple of ffmpeg codec, preset and extra ffmpeg params for the encoder
+    '''
+    video_codec, preset, ffmpeg_params = select_video_encoder(hwaccel)
+    return (video_codec, *INTERMEDIATE_ENCODER_SETTINGS.get(video_codec, (preset, ffmpeg_params)))
+
+
+@contextmanager
+def _file_lock(lock_filepath: str):
+    '''Hold an exclusive lock on the lock file, so only one process at a time runs
+    the locked block. No lock is taken where fcntl isn't available. Lock files can be removed
+    by the lock holder (see _evict_bg_cache), a lock taken on a removed file is retried.
+
+    :param lock_filepath: filepath to lock file, created if it doesnt exist
+    '''
+    if fcntl is None:
+        yield
+        return
+
+    while True:
+        lock_file = open(lock_filepath, 'w', encoding='utf-8')  # pylint: disable=consider-using-with
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if os.path.samestat(os.fstat(lock_file.fileno()), os.stat(lock_filepath)):
+                break
+        except FileNotFoundError:
+            pass
+        # removed while waiting for the lock
+        lock_file.close()
+
+    try:
+        yield
+    finally:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+
+def limit_worker_threads(threads: int) -> NoReturn:
+    '''Limit the threads numba's parallel compositing (lib.compositing) uses within a process
+    pool worker, so the workers together dont oversubscribe the cpu. numba reads NUMBA_NUM_THREADS
+    once when it's imported, so this is called before lib.compositing is imported. If numba is
+    already imported (inherited from the parent process) its thread count is set instead.
+
+    :param threads: threads a single worker can use
+    '''
+    os.environ['NUMBA_NUM_THREADS'] = str(threads)
+    if 'numba' in sys.modules:
+        import numba
+        numba.set_num_threads(min(threads, numba.config.NUMBA_NUM_THREADS))
+
+
+@contextmanager
+def _environ(**env: str):
+    '''Set environment variables for the duration of the block, the previous values
+    are restored afterwards.
+
+    :param env: environment variables to set
+    '''
+    previous = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _init_batch_worker(threads: int) -> NoReturn:
+    '''Initializer for generate_batch workers. Limits numba and (with threadpoolctl) numpy's
+    BLAS/OpenMP threads to the worker's share of the cpu so the workers dont oversubscribe the cpu.
+    numpy's libraries are already loaded when a forked worker starts, the OMP_NUM_THREADS set by
+    generate_batch only applies to spawned workers.
+
+    :param threads: threads a single worker can use
+    '''
+    limit_worker_threads(threads)
+    if threadpool_limits is not None:
+        threadpool_limits(limits=threads)
+
+
+def _probe_media(media_filepath: str) -> Tuple[float, bool]:
+    '''Get the duration of a media file and whether it has an audio stream, both are parsed
+    from a single "ffmpeg -i" call (ffmpeg prints the file info & exits as there's no output).
+
+    :param media_filepath: filepath to video/ audio file
+    :return: tuple of duration in seconds and True if the file has an audio stream
+    :raises: OSError (if ffmpeg couldn't read the file's duration)
+    '''
+    result = subprocess.run([FFMPEG, '-hide_banner', '-i', media_filepath],
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE,
+                            check=False)
+    file_info = result.stderr.decode('utf-8', errors='replace')
+    duration_match = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', file_info)
+    if duration_match is None:
+        raise OSError(f'ffmpeg could not read the duration of {media_filepath}:\n{file_info}')
+
+    hours, minutes, seconds = duration_match.groups()
+    duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    return duration, re.search(r'Stream #.*: Audio:', file_info) is not None
+
+
+def _get_audio_duration(audio_filepath: str) -> float:
+    '''Get the duration of an audio file. The audio files generated by AudioGenerator are
+    wav, so the duration is read from the wav header instead of starting an ffmpeg process.
+
+    :param audio_filepath: filepath to audio file
+    :return: duration in seconds
+    '''
+    try:
+        with wave.open(audio_filepath, 'rb') as wav_file:
+            return wav_file.getnframes() / wav_file.getframerate()
+    except (wave.Error, EOFError):
+        # not a wav file (i.e. older mp3 audio)
+        return _probe_media(audio_filepath)[0]
+
+
+def _probe_durations(audio_filepaths: List[str]) -> Dict[str, float]:
+    '''Get the durations of audio files.
+
+    :param audio_filepaths: filepaths to audio files
+    :return: dict of filepath to duration in seconds
+    '''
+    return {audio_filepath: _get_audio_duration(audio_filepath) for audio_filepath in audio_filepaths}
+
+
+@lru_cache(maxsize=None)
+def _load_font(font: str, fontsize: int) -> ImageFont.FreeTypeFont:
+    '''Load a truetype font, fonts are cached per font size.
+
+    :param font: font file, searched for in the system font folders if not a path
+    :param fontsize: font size of text
+    :return: loaded font
+    '''
+    return ImageFont.truetype(font, fontsize)
+
+
+def _render_text_image(text: str,
+                       fontsize: int,
+                       font: str = TEXT_FONT) -> Image.Image:
+    '''Render text to a transparent image with PIL, the image is sized to the text and
+    lines are centered (same layout as moviepy's TextClip with method label).
+
+    :param text: processed text with newlines inserted
+    :param fontsize: font size of text
+    :param font: font file (default: TEXT_FONT)
+    :return: RGBA image of the text
+    '''
+    pil_font = _load_font(font, fontsize)
+    text_kwargs = {'font': pil_font, 'align': 'center', 'stroke_width': TEXT_STROKE_WIDTH}
+
+    text_bbox = _MEASURE_DRAW.multiline_textbbox((0, 0), text, **text_kwargs)
+    left, top, right, bottom = (round(pos) for pos in text_bbox)
+    image = Image.new('RGBA', (right - left, bottom - top), (0, 0, 0, 0))
+    ImageDraw.Draw(image).multiline_text((-left, -top), text,
+                                         fill=TEXT_COLOR,
+                                         stroke_fill=TEXT_STROKE_COLOR,
+                                         **text_kwargs)
+
+    return image
+
+
+def _render_text_png(text: str,
+                     fontsize: int,
+                     output_path: str,
+                     font: str = TEXT_FONT) -> str:
+    '''Render text to a transparent png, see _render_text_image.
+
+    :param text: processed text with newlines inserted
+    :param fontsize: font size of text
+    :param output_path: filepath to write png
+    :param font: font file (default: TEXT_FONT)
+    :return: filepath to the png
+    '''
+    _render_text_image(text, fontsize, font).save(output_path)
+
+    return output_path
 
 
 class VideoGenerator:
@@ -14,53 +330,259 @@ class VideoGenerator:
     follows the output outlined in Class AudioGeneration. The system can generate
     videos to provided time limit.'''
 
+    # rendered ending message pngs, the message rarely changes so its reused across videos
+    _text_cache_dir = Path.home() / '.cache' / 'tiktok_text'
+    # (x1_start, x2_end, y1_start, y2_end) crop of the resized background, centered on the middle
+    TIKTOK_CROP_BOX = (1166.6, 2246.6, 0, 1920)
+
     def __init__(self,
                  videos_path: str,
-                 title_buffer: float = .8):
+                 title_buffer: float = .8,
+                 hwaccel: str = 'auto',
+                 bg_cache_gb: float = 2,
+                 bg_cache_clips: int = 3,
+                 renderer: str = 'moviepy',
+                 font_file: Optional[str] = None,
+                 encoder_threads: int = 0,
+                 decoder: str = 'moviepy'):
         '''Initialize VideoGeneration class and store folder path to
-        background filler videos.
+        background filler videos. The folder is scanned for background videos
+        once, the listing is reused for every video generated.
 
         :param videos_path: folder location where background videos are stored
         :param title_buffer: seconds to wait before title is removed to screen after
                              being read. (default: .8)
+        :param hwaccel: hardware encoder used to write the finalized video,
+                        see select_video_encoder (default: auto)
+        :param bg_cache_gb: max size in GB of the cropped background clip cache, 0 disables
+                            the cache (default: 2)
+        :param bg_cache_clips: number of cropped clips cached per background video, each starting
+                               at a different random point (default: 3)
+        :param renderer: moviepy to composite the video frame by frame in python, ffmpeg to render
+                         the whole video with a single ffmpeg filtergraph (default: moviepy)
+        :param font_file: font file used for the text overlays, if not provided
+                          TEXT_FONT is used (default: None)
+        :param encoder_threads: threads used by the video encoder, 0 lets ffmpeg decide (default: 0)
+        :param decoder: moviepy to read the background frames from an ffmpeg pipe, pyav to decode
+                        them in process with PyAV, only used by the moviepy renderer (default: moviepy)
+        :raises: ValueError (if decoder is pyav and PyAV isn't installed or a forced hwaccel isn't available)
         '''
+        if decoder == 'pyav' and find_spec('av') is None:
+            raise ValueError('The pyav decoder requires PyAV, install it with pip install av')
+        # fail before any video is generated if a forced hardware encoder can't be used
+        select_video_encoder(hwaccel)
+
         self.vid_path = videos_path
         self.title_buffer = title_buffer
+        self.hwaccel = hwaccel
+        self.bg_cache_gb = bg_cache_gb
+        self.bg_cache_clips = bg_cache_clips
+        self.bg_cache_path = join(videos_path, '.cache')
+        self.renderer = renderer
+        self.font = font_file or TEXT_FONT
+        self.encoder_threads = encoder_threads
+        self.decoder = decoder
+        # temp subclips used by the video being generated, removed once its written
+        self._temp_files = []
+        # scanned once, sorted so the listing is deterministic across platforms
+        self._bg_files = sorted(entry.name for entry in scandir(videos_path)
+                                if entry.name.endswith('.mp4'))
         # hardcoded (doesnt really need to be configurable)
         self.last_used_vid_filename = 'last_used.txt'
+        # last used vid name, kept in memory when the txt file doesnt exist yet
+        self._last_used_vid = None
 
     def pick_random_video(self) -> str:
-        '''Randomly pick a background file for use in TikTok video.
+        '''Randomly pick a background file for use in TikTok video. Multiple processes
+        can pick videos from the same folder, so the last used vid file is locked while
+        the video is picked.
 
         :return: file path to video randomly chosen
         :raises: ValueError (if no videos exist)
         '''
-        video_files = []
-        for maybe_vid in listdir(self.vid_path):
-            if maybe_vid.endswith('.mp4'):
-                video_files.append(maybe_vid)
-
-        if not video_files:
+        if not self._bg_files:
             raise ValueError(f'There are no .mp4 files in {self.vid_path}')
 
-        try:
-            # to avoid repeated video content, check txt file for last used vid name
-            with open(join(self.vid_path, self.last_used_vid_filename), 'r') as txt_file:
-                last_video_file_used = txt_file.read().strip()
-            video_files = list(
-                filter(lambda vid: vid != last_video_file_used, video_files))
-        except IOError:
-            # first time run or new video folder, ignore error
-            pass
+        last_used_filepath = join(self.vid_path, self.last_used_vid_filename)
+        with _file_lock(f'{last_used_filepath}.lock'):
+            # other processes may have picked a video since the last pick
+            if exists(last_used_filepath):
+                self._last_used_vid = Path(last_used_filepath).read_text(encoding='utf-8').strip()
 
-        chosen_video = choice(video_files)
+            # to avoid repeated video content, exclude last used vid
+            # (unless its the only video in the folder)
+            video_files = sorted(set(self._bg_files) - {self._last_used_vid}) or self._bg_files
 
-        # write vid name to txt file to avoid repeat background videos
-        with open(join(self.vid_path, self.last_used_vid_filename), 'w') as txt_file:
-            txt_file.write(chosen_video)
+            chosen_video = choice(video_files)
+            self._last_used_vid = chosen_video
+
+            # write vid name to txt file to avoid repeat background videos
+            # written to a temp file first so the txt file is replaced atomically
+            temp_filepath = f'{last_used_filepath}.{getpid()}.tmp'
+            with open(temp_filepath, 'w', encoding='utf-8') as txt_file:
+                txt_file.write(chosen_video)
+            replace(temp_filepath, last_used_filepath)
 
         return join(self.vid_path, chosen_video)
 
+    def _evict_bg_cache(self, keep_filepath: str) -> NoReturn:
+        '''Remove the least recently used clips from the background cache until the
+        cache is within bg_cache_gb. Clips are removed under their key's lock and only if they
+        weren't used since the cache was scanned, so clips other processes just chose are kept.
+        A clip's lock file is removed with it, temp files older than STALE_TEMP_AGE are left
+        over from killed processes and are removed as well.
+
+        :param keep_filepath: cached clip that is about to be used, never removed
+        '''
+        cache_limit = self.bg_cache_gb * 1024 ** 3
+        stale_time = time() - STALE_TEMP_AGE
+        cached_clips = []
+        for entry in scandir(self.bg_cache_path):
+            if entry.name.endswith('.mp4'):
+                cached_clips.append((entry.path, entry.stat()))
+            elif entry.name.endswith('.tmp') and entry.stat().st_mtime < stale_time:
+                Path(entry.path).unlink(missing_ok=True)
+        # most recently used first
+        cached_clips.sort(key=lambda clip: clip[1].st_mtime, reverse=True)
+
+        cache_size = 0
+        for clip_filepath, clip_stat in cached_clips:
+            cache_size += clip_stat.st_size
+            if cache_size > cache_limit and clip_filepath != keep_filepath:
+                # "<key hash>_<start>.mp4"
+                key_prefix = clip_filepath.rsplit('_', 1)[0]
+                with _file_lock(f'{key_prefix}.lock'), _file_lock(f'{clip_filepath}.lock'):
+                    try:
+                        if os.stat(clip_filepath).st_mtime == clip_stat.st_mtime:
+                            Path(clip_filepath).unlink()
+                            Path(f'{clip_filepath}.lock').unlink(missing_ok=True)
+                    except FileNotFoundError:
+                        pass
+
+    @staticmethod
+    def _get_crop_filter(crop_box: Tuple[float, float, float, float]) -> str:
+        '''Get the ffmpeg filter that crops & resizes a background video to vertical format.
+        The crop box is in the coordinates of the video resized to a height of y2_end, so it's
+        scaled to the input height to crop first and only the cropped region is resized.
+
+        :param crop_box: (x1_start, x2_end, y1_start, y2_end) crop of video, see crop_video_to_tiktok_format
+        :return: ffmpeg crop & scale filter
+        '''
+        x1_start, x2_end, y1_start, y2_end = crop_box
+        # input pixels per pixel of the resized video
+        input_scale = f'ih/{y2_end}'
+
+        # output size rounded, ffmpeg truncates fractional sizes which can give odd widths that h264 rejects
+        return (f'crop={x2_end - x1_start}*{input_scale}:{y2_end - y1_start}*{input_scale}'
+                f':{x1_start}*{input_scale}:{y1_start}*{input_scale},'
+                f'scale={round(x2_end - x1_start)}:{round(y2_end - y1_start)}')
+
+    def _prep_background(self,
+                         video_filepath: str,
+                         start: float,
+                         length: float,
+                         crop_box: Tuple[float, float, float, float],
+                         output_path: str) -> NoReturn:
+        '''Cut, crop & resize a subclip of the background video with a single ffmpeg call,
+        seeking before the input so ffmpeg jumps to the closest keyframe instead of decoding
+        every frame up to the start of the subclip.
+
+        :param video_filepath: filepath to video that will be cut and resized
+        :param start: timestamp in seconds of the start of the subclip
+        :param length: length in seconds of the subclip
+        :param crop_box: (x1_start, x2_end, y1_start, y2_end) crop of video, see crop_video_to_tiktok_format
+        :param output_path: filepath to write the subclip (mp4)
+        '''
+        video_codec, preset, ffmpeg_params = select_intermediate_encoder(self.hwaccel)
+
+        ffmpeg_cmd = [FFMPEG, '-y', '-hide_banner', '-loglevel', 'error']
+        if video_codec.endswith('_nvenc'):
+            # decode on gpu as well
+            ffmpeg_cmd += ['-hwaccel', 'cuda']
+        ffmpeg_cmd += ['-ss', str(start), '-t', str(length),
+                       '-i', video_filepath,
+                       # resize video to vertical format (defaults center on middle of video)
+                       '-vf', self._get_crop_filter(crop_box),
+                       '-c:v', video_codec, '-preset', preset, *(ffmpeg_params or []),
+                       '-c:a', 'aac', '-f', 'mp4',
+                       output_path]
+        subprocess.run(ffmpeg_cmd, check=True)
+
+    def _get_cached_subclip(self,
+                            video_filepath: str,
+                            subclip_length: int,
+                            crop_box: Tuple[float, float, float, float]) -> str:
+        '''Get a cropped & resized random subclip of the video from the background cache.
+        Clips are cached by (video, length, crop box), until bg_cache_clips clips are cached
+        for a key a new clip is created at a new random point, afterwards a cached clip is
+        randomly chosen. On a miss the subclip is cut, cropped and encoded in a single ffmpeg
+        call rather than decoded & re-encoded through moviepy. Clips being cut by another process
+        count towards bg_cache_clips, a process choosing one waits for it to be done.
+
+        :param video_filepath: filepath to video that will be cut and resized
+        :param subclip_length: length in seconds of resized video
+        :param crop_box: (x1_start, x2_end, y1_start, y2_end) crop of video, see crop_video_to_tiktok_format
+        :return: filepath to the cached clip
+        '''
+        cache_key = (abspath(video_filepath), subclip_length, crop_box)
+        key_hash = blake2b(repr(cache_key).encode(), digest_size=16).hexdigest()
+        key_prefix = join(self.bg_cache_path, key_hash)
+
+        makedirs(self.bg_cache_path, exist_ok=True)
+        with ExitStack() as clip_lock:
+            # clips are counted & reserved under the key's lock, so batch workers starting at the
+            # same time share the clips being cut instead of each decoding the background video
+            with _file_lock(f'{key_prefix}.lock'):
+                cached_clips = glob(f'{key_prefix}_*.mp4')
+                # clips other processes are cutting, "<clip>.<pid>.tmp". without fcntl
+                # there's no waiting for them, each process cuts its own clips
+                pending_clips = [] if fcntl is None else [
+                    temp_filepath.rsplit('.', 2)[0]
+                    for temp_filepath in glob(f'{key_prefix}_*.mp4.*.tmp')]
+
+                if len(cached_clips) + len(pending_clips) >= self.bg_cache_clips:
+                    cached_filepath = choice(cached_clips or pending_clips)
+                else:
+                    # pick a randompoint in the video duration for start of subclip
+                    # duration is float, so converted to int
+                    duration, _ = _probe_media(video_filepath)
+                    random_point = randrange(0, int(duration) - subclip_length, subclip_length)
+                    cached_filepath = f'{key_prefix}_{random_point}.mp4'
+
+                if cached_filepath in cached_clips or cached_filepath in pending_clips:
+                    temp_filepath = None
+                else:
+                    # held while the clip is cut, processes waiting for the clip block on it
+                    clip_lock.enter_context(_file_lock(f'{cached_filepath}.lock'))
+                    # ffmpeg writes to a temp file so other processes never use a partial clip
+                    temp_filepath = f'{cached_filepath}.{getpid()}.tmp'
+                    Path(temp_filepath).touch()
+
+            if temp_filepath is not None:
+                try:
+                    self._prep_background(video_filepath, random_point, subclip_length,
+                                          crop_box, temp_filepath)
+                    replace(temp_filepath, cached_filepath)
+                finally:
+                    Path(temp_filepath).unlink(missing_ok=True)
+
+        if not exists(cached_filepath):
+            # wait for the process cutting the clip
+            with _file_lock(f'{cached_filepath}.lock'):
+                if not exists(cached_filepath):
+                    # the process failed or was killed, its temp file is no longer pending
+                    for temp_filepath in glob(f'{cached_filepath}.*.tmp'):
+                        Path(temp_filepath).unlink(missing_ok=True)
+
+        try:
+            # mark clip as most recently used, raises if the clip failed or was just evicted
+            os.utime(cached_filepath)
+        except FileNotFoundError:
+            return self._get_cached_subclip(video_filepath, subclip_length, crop_box)
+        self._evict_bg_cache(cached_filepath)
+
+        return cached_filepath
+
     def crop_video_to_tiktok_format(self,
                                     video_filepath: str,
                                     subclip_length: int,
@@ -72,6 +594,7 @@ class VideoGenerator:
         '''Given the filepath to video file, resize the horizontal video to vertical mode and
         create a random length subclip for use. The length provided is used to find a random subclip.
         The default crop positions center video vertically in the middle of the loaded video.
+        If the background cache is enabled, the cropped subclip is loaded from the cache.
 
         :param video_filepath: filepath to video that will be loaded and resized
         :param subclip_length: length in seconds of resized video
@@ -83,66 +606,106 @@ class VideoGenerator:
 
         :return: resized video instance
         '''
-        video = VideoFileClip(video_filepath)
-        # pick a randompoint in the video duration for start of subclip
-        # duration is float, so converted to int
-        random_point = randrange(
-            0, int(video.duration) - subclip_length, subclip_length)
-
-        # create subclip of loaded video
-        subclip = video.subclip(random_point, random_point+subclip_length)
-
-        # resize video to vertical format (defaults center on middle of video)
-        subclip = subclip.resize(height=y2_end)
-        subclip = subclip.crop(x1=x1_start,
-                               y1=y1_start,
-                               x2=x2_end,
-                               y2=y2_end)
-
-        # reduce clip volume
-        subclip = subclip.volumex(subclip_volume_multiplier)
+        crop_box = (x1_start, x2_end, y1_start, y2_end)
+        if self.bg_cache_gb > 0:
+            subclip_filepath = self._get_cached_subclip(video_filepath, subclip_length, crop_box)
+        else:
+            # pick a randompoint in the video duration for start of subclip
+            # duration is float, so converted to int
+            duration, _ = _probe_media(video_filepath)
+            random_point = randrange(
+                0, int(duration) - subclip_length, subclip_length)
+
+            # subclip is stored in a temp file, removed after the video is written
+            temp_fd, subclip_filepath = mkstemp(suffix='.mp4')
+            os.close(temp_fd)
+            self._temp_files.append(subclip_filepath)
+            self._prep_background(video_filepath, random_point, subclip_length,
+                                  crop_box, subclip_filepath)
+
+        from moviepy.audio.fx.volumex import volumex
+        from moviepy.video.io.VideoFileClip import VideoFileClip
+        from lib.compositing import PyAVVideoClip, to_uint8
+
+        # reduce clip volume, frames are kept as uint8 through the compositing
+        if self.decoder == 'pyav':
+            subclip = PyAVVideoClip(subclip_filepath)
+        else:
+            subclip = VideoFileClip(subclip_filepath).fl_image(to_uint8)
+        subclip = subclip.fx(volumex, subclip_volume_multiplier)
         # return a subclip from the resized video
         return subclip
 
     def write_tiktok_video_to_file(self,
                                    video: VideoFileClip,
                                    output_path: str,
-                                   video_codec: str = 'libx264',
+                                   hwaccel: str = 'auto',
+                                   video_codec: Optional[str] = None,
                                    audio_codec: str = 'aac') -> NoReturn:
         '''Given a VideoFileClip instance that represents the finalized TikTok video,
         write the video to file using the provided output_path. The file defaults to using
-        the codecs for mp4.
+        the codecs for mp4, encoded on the gpu when a hardware encoder is available.
 
         :param video: finalized VideoFileClip instance
         :param output_path: filepath to write video
-        :param video_codec: video codec format for output video (default: libx264)
+        :param hwaccel: hardware encoder to use, see select_video_encoder (default: auto)
+        :param video_codec: video codec format for output video, overrides hwaccel (default: None)
         :param audio_codec: audito codec format for output video (default: aac)
 
         :return: NoReturn
         '''
-        video.write_videofile(
-            output_path, codec=video_codec, audio_codec=audio_codec)
+        if video_codec is None:
+            video_codec, preset, ffmpeg_params = select_video_encoder(hwaccel)
+        else:
+            preset, ffmpeg_params = CPU_ENCODER[1:]
+
+        try:
+            video.write_videofile(output_path,
+                                  codec=video_codec,
+                                  audio_codec=audio_codec,
+                                  preset=preset,
+                                  ffmpeg_params=[*(ffmpeg_params or []), *MP4_MUX_PARAMS],
+                                  threads=self.encoder_threads)
+        finally:
+            # temp subclips of the video are no longer needed
+            for temp_filepath in self._temp_files:
+                Path(temp_filepath).unlink(missing_ok=True)
+            self._temp_files.clear()
 
     @staticmethod
+    @lru_cache(maxsize=512)
     def process_text(text: str,
                      char_count) -> str:
         '''Add newlines to text so that textclips generated from the provided text do
-        not exceed horizontal width of TikTok video.
+        not exceed horizontal width of TikTok video. Results are cached so repeated
+        texts aren't wrapped again.
 
         :param char_count: count of words before newline is inserted (default: 8)
 
         :return: text with newlines inserted at after each word count
         '''
-        text_list = wrap(text, char_count, break_long_words=False)
+        return '\n'.join(wrap(text, char_count, break_long_words=False))
 
-        final_text = ''
-        for i, block in enumerate(text_list):
-            if i == 0:
-                final_text = block
-            else:
-                final_text = f'{final_text}\n{block}'
+    def _get_end_msg_png(self, end_msg: str, fontsize: int = 150) -> str:
+        '''Get the png of the ending message from the text cache, the png is rendered if
+        its not cached yet. Pngs are cached by message, font size & font.
+
+        :param end_msg: ending message text
+        :param fontsize: font size of text (default: 150)
+        :return: filepath to the ending message png
+        '''
+        cache_key = (end_msg, fontsize, self.font, TEXT_COLOR, TEXT_STROKE_COLOR, TEXT_STROKE_WIDTH)
+        key_hash = blake2b(repr(cache_key).encode(), digest_size=16).hexdigest()
+        cached_filepath = self._text_cache_dir / f'{key_hash}.png'
 
-        return final_text
+        if not cached_filepath.exists():
+            self._text_cache_dir.mkdir(parents=True, exist_ok=True)
+            # rendered to a temp file so other processes never use a partial png
+            temp_filepath = self._text_cache_dir / f'{key_hash}.{getpid()}.tmp.png'
+            _render_text_png(end_msg, fontsize, str(temp_filepath), self.font)
+            replace(temp_filepath, cached_filepath)
+
+        return str(cached_filepath)
 
     def add_ending_message(self,
                            video: VideoFileClip,
@@ -161,19 +724,19 @@ class VideoGenerator:
         # ending credit time length, tries to be 3 seconds
         end_msg_duration = min(video_duration-lst_msg_timestamp, 3)
 
-        endmsg_textclip = TextClip(end_msg,
-                                   fontsize=150,
-                                   font='Calibri-Bold',
-                                   align='center',
-                                   color='white',
-                                   stroke_color='black',
-                                   stroke_width=2,
-                                   method='label')
+        # no time left for the ending message
+        if end_msg_duration <= 0:
+            return video
+
+        from moviepy.video.VideoClip import ImageClip
+        from lib.compositing import CompositeClip
+
+        endmsg_textclip = ImageClip(self._get_end_msg_png(end_msg))
         # set textclip position in timeline and on screen
         endmsg_textclip = endmsg_textclip.set_pos(('center', 500))
         endmsg_textclip = endmsg_textclip.set_start(lst_msg_timestamp)
 
-        video = CompositeVideoClip(
+        video = CompositeClip(
             [video, endmsg_textclip]).set_duration(lst_msg_timestamp+end_msg_duration)
 
         return video
@@ -192,18 +755,16 @@ class VideoGenerator:
 
         :return: edited video with overlay of title text & timestamp for when title audio ends
         '''
+        from moviepy.audio.io.AudioFileClip import AudioFileClip
+        from moviepy.video.VideoClip import ImageClip
+        from lib.compositing import CompositeClip
+
         processed_text = self.process_text(title_info['text'], char_count)
 
         # hardcoding various text attrs for stylistic reasons
         # individual users can change as needed
-        title_textclip = TextClip(processed_text,
-                                  fontsize=70,
-                                  font='Calibri-Bold',
-                                  align='center',
-                                  color='white',
-                                  stroke_color='black',
-                                  stroke_width=2,
-                                  method='label')
+        text_image = _render_text_image(processed_text, 70, self.font)
+        title_textclip = ImageClip(np.asarray(text_image, dtype=np.uint8))
         title_audioclip = AudioFileClip(title_info['audio_filepath'])
 
         # add textclip for duration of title audio
@@ -216,11 +777,58 @@ class VideoGenerator:
             ('center', 300)).set_duration(title_duration + self.title_buffer)
         title_textclip = title_textclip.set_audio(title_audioclip)
 
-        video = CompositeVideoClip(
+        video = CompositeClip(
             [video, title_textclip]).set_duration(video.duration)
 
         return video, title_duration + self.title_buffer
 
+    @staticmethod
+    def _get_audio_mix_filters(audios: List[Tuple[str, float]],
+                               duration: float,
+                               first_input: int,
+                               output_label: str) -> List[str]:
+        '''Get the ffmpeg filters that mix audio inputs, each starting at its timestamp.
+        Each audio is delayed to its start and padded to the full length, amix then always
+        divides by the number of inputs which is undone by the volume filter.
+
+        :param audios: list of (audio filepath, start timestamp), in ffmpeg input order
+        :param duration: length in seconds of the mixed audio
+        :param first_input: ffmpeg input index of the first audio
+        :param output_label: filtergraph label of the mixed audio
+        :return: list of ffmpeg filters
+        '''
+        audio_filters = []
+        for i, (_, start) in enumerate(audios):
+            delay = round(start * 1000)
+            audio_filters.append(f'[{first_input + i}:a]adelay={delay}|{delay},apad,'
+                                 f'atrim=0:{duration:.3f}[a{i}]')
+        audio_filters.append(''.join(f'[a{i}]' for i in range(len(audios))) +
+                             f'amix=inputs={len(audios)}:dropout_transition=0,'
+                             f'volume={len(audios)}[{output_label}]')
+
+        return audio_filters
+
+    def _mix_audio_files(self,
+                         audios: List[Tuple[str, float]],
+                         duration: float,
+                         output_path: str) -> NoReturn:
+        '''Mix audio files into a single wav, each audio starting at its timestamp.
+
+        :param audios: list of (audio filepath, start timestamp)
+        :param duration: length in seconds of the mixed audio
+        :param output_path: filepath to write wav
+        '''
+        audio_inputs = [arg for audio_filepath, _ in audios for arg in ('-i', audio_filepath)]
+        audio_filters = self._get_audio_mix_filters(audios, duration, 0, 'aout')
+
+        subprocess.run([FFMPEG, '-y', '-hide_banner', '-loglevel', 'error',
+                        *audio_inputs,
+                        '-filter_complex', ';'.join(audio_filters),
+                        '-map', '[aout]',
+                        '-c:a', 'pcm_s16le', '-f', 'wav',
+                        output_path],
+                       check=True)
+
     def write_multi_text_to_video(self,
                                   video: VideoFileClip,
                                   title_offset: float,
@@ -241,50 +849,188 @@ class VideoGenerator:
 
         :return: edited video containing the text & audio trimmed to final length of all audio
         '''
+        from moviepy.audio.AudioClip import CompositeAudioClip
+        from moviepy.audio.io.AudioFileClip import AudioFileClip
+        from moviepy.video.VideoClip import ImageClip
+        from lib.compositing import CompositeClip
+
         # starting offset for text audio at title offset
         current_text_offset = title_offset
-        text_clips = []
+        # (processed text, audio filepath, start timestamp) of texts within max video length
+        text_timeline = []
 
+        text_char_count = char_count + TEXT_EXTRA_CHAR_COUNT
+        durations = _probe_durations([text_dict['audio_filepath'] for text_dict in texts_list])
         for text_dict in texts_list:
-            processed_text = self.process_text(text_dict['text'], char_count+8)
-            text_audioclip = AudioFileClip(text_dict['audio_filepath'])
-            text_duration = text_audioclip.duration
+            text_duration = durations[text_dict['audio_filepath']]
 
             # check that current text's audio length is within max video length
             if current_text_offset + text_duration <= max_vid_length:
-                # create text clip for processed text
-                # hardcoding various text attrs for stylistic reasons
-                text_vidclip = TextClip(processed_text,
-                                        fontsize=60,
-                                        font='Calibri-Bold',
-                                        align='center',
-                                        color='white',
-                                        stroke_color='black',
-                                        stroke_width=2,
-                                        method='label')
-
-                # add audio to clip & set the clip's offset
-                # to be starting at the end of the previous textclip's end
-                text_vidclip = text_vidclip.set_audio(text_audioclip)
-                text_vidclip = text_vidclip.set_start(current_text_offset)
-
-                # set position of the clip and set duration to be length of audio
-                text_vidclip = text_vidclip.set_position(
-                    ('center', 320)).set_duration(text_duration)
-
-                # append to the text clip list
-                text_clips.append(text_vidclip)
+                processed_text = self.process_text(text_dict['text'], text_char_count)
+                text_timeline.append((processed_text, text_dict['audio_filepath'], current_text_offset))
 
                 # add audio length to offset for next text to be processed, adding smaller buffer
                 current_text_offset += text_duration + time_offset
 
-        video = CompositeVideoClip(
+        text_clips = []
+        for processed_text, audio_filepath, text_start in text_timeline:
+            # create image clip for rendered text, rendered once and reused for every frame
+            # hardcoding various text attrs for stylistic reasons
+            text_image = _render_text_image(processed_text, 60, self.font)
+            text_vidclip = ImageClip(np.asarray(text_image, dtype=np.uint8))
+
+            # set the clip's offset to be starting at the end of the previous textclip's end
+            text_vidclip = text_vidclip.set_start(text_start)
+
+            # set position of the clip and set duration to be length of audio
+            text_vidclip = text_vidclip.set_position(
+                ('center', 320)).set_duration(durations[audio_filepath])
+
+            # append to the text clip list
+            text_clips.append(text_vidclip)
+
+        video = CompositeClip(
             [video, *text_clips]).set_duration(video.duration)
 
+        if text_timeline:
+            # text audios are mixed into one wav (next to the audio files) so moviepy
+            # reads a single audio file instead of one per text
+            combined_audio_filepath = join(dirname(text_timeline[0][1]), 'combined_audio.wav')
+            self._mix_audio_files([(audio_filepath, text_start)
+                                   for _, audio_filepath, text_start in text_timeline],
+                                  current_text_offset,
+                                  combined_audio_filepath)
+            audio_clips = [AudioFileClip(combined_audio_filepath)]
+            if video.audio is not None:
+                audio_clips.insert(0, video.audio)
+            video = video.set_audio(CompositeAudioClip(audio_clips))
+
         video = self.add_ending_message(video,
                                         current_text_offset)
         return video
 
+    def _render_with_ffmpeg(self,
+                            background_video: str,
+                            title_info: Dict[str, str],
+                            texts_list: List[Dict[str, str]],
+                            output_path: str,
+                            max_vid_length: float,
+                            char_count: int,
+                            time_offset: float,
+                            subclip_volume_multiplier: float = .2,
+                            end_msg: str = "Like\n&\nFollow\nfor more!") -> NoReturn:
+        '''Render the TikTok video with a single ffmpeg call instead of compositing it frame by
+        frame with moviepy and piping the raw frames to ffmpeg. The background is cropped, the
+        pre-rendered title, texts and ending message pngs are overlayed and the audios are mixed
+        with amix in one filtergraph, the text layout and timing matches write_title_to_video,
+        write_multi_text_to_video and add_ending_message. The pngs are stored next to the audio files.
+
+        :param background_video: filepath to background video
+        :param title_info: dict containing the title text and title audio filepath
+        :param texts_list: list of dict containing text and audio filepath
+        :param output_path: filepath to write video
+        :param max_vid_length: maximum length in seconds that video can be
+        :param char_count: count of words before newline is inserted
+        :param time_offset: seconds to wait between each text block
+        :param subclip_volume_multiplier: background video volume multiplier (default: .2)
+        :param end_msg: what message to put at the end of video (default: "Like & Follow for more!")
+
+        :return: NoReturn
+        '''
+        if self.bg_cache_gb > 0:
+            background_filepath = self._get_cached_subclip(background_video,
+                                                           max_vid_length,
+                                                           self.TIKTOK_CROP_BOX)
+            background_input = ['-i', background_filepath]
+            background_filter = 'null'
+            _, background_has_audio = _probe_media(background_filepath)
+        else:
+            # pick a randompoint in the video duration for start of subclip
+            # duration & audio stream are probed together
+            duration, background_has_audio = _probe_media(background_video)
+            random_point = randrange(0, int(duration) - max_vid_length, max_vid_length)
+            background_input = ['-ss', str(random_point), '-t', str(max_vid_length),
+                                '-i', background_video]
+            background_filter = self._get_crop_filter(self.TIKTOK_CROP_BOX)
+
+        durations = _probe_durations([title_info['audio_filepath'],
+                                      *(text_dict['audio_filepath'] for text_dict in texts_list)])
+
+        # (processed text, font size, png filepath) of the pngs to render
+        texts = []
+        # (png filepath, y position, start timestamp, end timestamp) of each overlay
+        overlays = []
+        # (audio filepath, start timestamp)
+        audios = [(title_info['audio_filepath'], 0)]
+
+        # title is shown for the title audio + title buffer
+        title_duration = durations[title_info['audio_filepath']]
+        title_offset = title_duration + self.title_buffer
+        title_png_filepath = f'{splitext(title_info["audio_filepath"])[0]}.png'
+        texts.append((self.process_text(title_info['text'], char_count), 70, title_png_filepath))
+        overlays.append((title_png_filepath, 300, 0, title_offset))
+
+        # texts are added back to back until the max video length is reached
+        current_text_offset = title_offset
+        text_char_count = char_count + TEXT_EXTRA_CHAR_COUNT
+        for text_dict in texts_list:
+            text_duration = durations[text_dict['audio_filepath']]
+
+            if current_text_offset + text_duration <= max_vid_length:
+                png_filepath = f'{splitext(text_dict["audio_filepath"])[0]}.png'
+                texts.append((self.process_text(text_dict['text'], text_char_count), 60, png_filepath))
+                overlays.append((png_filepath, 320, current_text_offset,
+                                 current_text_offset + text_duration))
+                audios.append((text_dict['audio_filepath'], current_text_offset))
+
+                current_text_offset += text_duration + time_offset
+
+        # ending credit time length, tries to be 3 seconds
+        end_msg_duration = min(max_vid_length - current_text_offset, 3)
+        final_duration = current_text_offset + end_msg_duration
+        # skipped if there's no time left for the ending message
+        if end_msg_duration > 0:
+            overlays.append((self._get_end_msg_png(end_msg), 500, current_text_offset, final_duration))
+
+        for text, fontsize, png_filepath in texts:
+            _render_text_png(text, fontsize, png_filepath, self.font)
+
+        # each png is a single frame input, overlay repeats it until the overlay is disabled
+        overlay_inputs = [arg for png_filepath, _, _, _ in overlays for arg in ('-i', png_filepath)]
+        video_filters = [f'[0:v]{background_filter}[v0]']
+        for i, (_, y_pos, start, end) in enumerate(overlays, start=1):
+            video_filters.append(f"[v{i - 1}][{i}:v]overlay=x=(W-w)/2:y={y_pos}"
+                                 f":enable='between(t,{start:.3f},{end:.3f})'[v{i}]")
+
+        audio_inputs = [arg for audio_filepath, _ in audios for arg in ('-i', audio_filepath)]
+        if background_has_audio:
+            audio_filters = self._get_audio_mix_filters(audios, final_duration, len(overlays) + 1, 'speech')
+            # mix reduced volume background audio with the text audios
+            audio_filters.append(f'[0:a]volume={subclip_volume_multiplier}[bg]')
+            audio_filters.append('[bg][speech]amix=inputs=2:dropout_transition=0,volume=2[aout]')
+        else:
+            # silent background (i.e. gameplay clips), only the text audios are used
+            audio_filters = self._get_audio_mix_filters(audios, final_duration, len(overlays) + 1, 'aout')
+
+        filtergraph = ';'.join([*video_filters, *audio_filters])
+
+        video_codec, preset, ffmpeg_params = select_video_encoder(self.hwaccel)
+        ffmpeg_cmd = [FFMPEG, '-y', '-hide_banner', '-loglevel', 'error']
+        if video_codec.endswith('_nvenc'):
+            # decode on gpu as well
+            ffmpeg_cmd += ['-hwaccel', 'cuda']
+        ffmpeg_cmd += [*background_input, *overlay_inputs, *audio_inputs,
+                       '-filter_complex', filtergraph,
+                       '-map', f'[v{len(overlays)}]', '-map', '[aout]',
+                       '-t', f'{final_duration:.3f}',
+                       '-c:v', video_codec, '-preset', preset, *(ffmpeg_params or []),
+                       '-pix_fmt', 'yuv420p',
+                       '-threads', str(self.encoder_threads),
+                       '-c:a', 'aac',
+                       *MP4_MUX_PARAMS,
+                       output_path]
+        subprocess.run(ffmpeg_cmd, check=True)
+
     def preview_clip(self, video: VideoFileClip, timestamp: int = 0) -> NoReturn:
         '''Generate a png from the videoclip for testing/ quality control at provided time stamp.
 
@@ -326,6 +1072,19 @@ class VideoGenerator:
         # choose random background video
         background_video = self.pick_random_video()
 
+        # create final filepath to output video
+        output_filepath = join(output_folder, self.make_filename('qna'))
+
+        if self.renderer == 'ffmpeg':
+            self._render_with_ffmpeg(background_video,
+                                     submission['title'],
+                                     submission['comments'],
+                                     output_filepath,
+                                     max_vid_length,
+                                     char_count,
+                                     .5)
+            return
+
         # crop randomly chosen video to input length and resize to vertical video
         cropped_video = self.crop_video_to_tiktok_format(
             background_video, max_vid_length)
@@ -343,10 +1102,8 @@ class VideoGenerator:
                                                      char_count,
                                                      .5)  # wait .5 seconds between answers
 
-        # create final filepath to output video & write to file
-        output_filepath = join(output_folder, self.make_filename('qna'))
-
-        self.write_tiktok_video_to_file(final_video, output_filepath)
+        # write finalized video to file
+        self.write_tiktok_video_to_file(final_video, output_filepath, hwaccel=self.hwaccel)
 
     def generate_video_from_advice_submission(self,
                                               submission: Dict[str, Union[Dict, List[Dict[str, str]]]],
@@ -370,6 +1127,19 @@ class VideoGenerator:
         # choose random background video
         background_video = self.pick_random_video()
 
+        # create final filepath to output video
+        output_filepath = join(output_folder, self.make_filename('advice'))
+
+        if self.renderer == 'ffmpeg':
+            self._render_with_ffmpeg(background_video,
+                                     submission['title'],
+                                     submission['postbody'],
+                                     output_filepath,
+                                     max_vid_length,
+                                     char_count,
+                                     .1)
+            return
+
         # crop randomly chosen video to input length and resize to vertical video
         cropped_video = self.crop_video_to_tiktok_format(
             background_video, max_vid_length)
@@ -387,6 +1157,74 @@ class VideoGenerator:
                                                      char_count,
                                                      .1)  # wait .1 seconds between chunks
 
-        # create final filepath to output video & write to file
-        output_filepath = join(output_folder, self.make_filename('advice'))
-        self.write_tiktok_video_to_file(final_video, output_filepath)
+        # write finalized video to file
+        self.write_tiktok_video_to_file(final_video, output_filepath, hwaccel=self.hwaccel)
+
+    def generate_batch(self,
+                       submissions: List[Dict[str, Union[Dict, List[Dict[str, str]]]]],
+                       output_folders: List[str],
+                       kind: str = 'qna',
+                       char_count: int = 24,
+                       max_vid_length: Optional[float] = None,
+                       max_workers: Optional[int] = None) -> NoReturn:
+        '''Generate TikTok videos for multiple submissions in parallel, each video is
+        generated in its own process. The videos are generated by a separate generator with
+        the same options, except the encoder threads are limited to 2 so the processes
+        share the cpu instead of each encode using every core.
+
+        :param submissions: audio enriched submission dicts generated by AudioGenerator
+        :param output_folders: folder to store each finalized TikTok video (one per submission)
+        :param kind: type of submissions (qna or advice) (default: qna)
+        :param char_count: count of words before newline is inserted (default: 24)
+        :param max_vid_length: maximum video length in seconds, if not provided the default
+                               of the kind's generate_video_from_*_submission is used (default: None)
+        :param max_workers: number of videos generated at the same time (default: cpu count)
+
+        :return: NoReturn
+        :raises: ValueError (if there isn't one output folder per submission or the kind is unknown)
+        '''
+        if len(submissions) != len(output_folders):
+            raise ValueError(f'{len(submissions)} submissions were passed with {len(output_folders)} '
+                             'output folders, there must be one output folder per submission')
+        if kind not in KINDS:
+            raise ValueError(f'Unknown kind {kind}, expected one of {KINDS}')
+
+        batch_generator = VideoGenerator(self.vid_path,
+                                         title_buffer=self.title_buffer,
+                                         hwaccel=self.hwaccel,
+                                         bg_cache_gb=self.bg_cache_gb,
+                                         bg_cache_clips=self.bg_cache_clips,
+                                         renderer=self.renderer,
+                                         font_file=self.font,
+                                         encoder_threads=2,
+                                         decoder=self.decoder)
+        generate_video = getattr(batch_generator, f'generate_video_from_{kind}_submission')
+
+        video_kwargs = {'char_count': char_count}
+        if max_vid_length is not None:
+            video_kwargs['max_vid_length'] = max_vid_length
+
+        max_workers = max_workers or cpu_count()
+        worker_threads = max(1, (cpu_count() or 1) // max_workers)
+        # workers are started within the block & inherit the environment
+        with _environ(OMP_NUM_THREADS=str(worker_threads), NUMBA_NUM_THREADS=str(worker_threads)), \
+                ProcessPoolExecutor(max_workers=max_workers,
+                                    initializer=_init_batch_worker,
+                                    initargs=(worker_threads,)) as executor:
+            # raise the first error after all videos are done
+            futures = [executor.submit(generate_video, submission, output_folder, **video_kwargs)
+                       for submission, output_folder in zip(submissions, output_folders)]
+            for future in futures:
+                future.result()
+
+
+@lru_cache(maxsize=4)
+def get_video_generator(videos_path: str, **kwargs) -> VideoGenerator:
+    '''Get the VideoGenerator for the provided background videos folder. Instances
+    are memoized so repeated calls with the same folder & options reuse the same generator.
+
+    :param videos_path: folder location where background videos are stored
+    :param kwargs: VideoGenerator options (i.e. hwaccel)
+    :return: VideoGenerator instance for the folder
+    '''
+    return VideoGenerator(videos_path, **kwargs)
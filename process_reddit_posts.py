@@ -1,9 +1,9 @@
 '''Script used to generate Reddit content jsons that can
 be used downstream to create TikTok Videos.'''
 from typing import NoReturn
-import json
 from os.path import join
 from argparse import ArgumentParser, Namespace
+import orjson
 
 from lib.generate_reddit_content import ContentGenerator
 from config.base import CONFIG
@@ -60,6 +60,13 @@ def create_parser() -> ArgumentParser:
                         choices=['confidence', 'controversial',
                                  'new', 'old', 'top'],
                         help='heurisitic used to sort comments (QnA only)')
+    parser.add_argument('--fetch_more_comments',
+                        action='store_true',
+                        help='request collapsed "load more comments", slower as each is an extra API call (QnA only)')
+    parser.add_argument('--fetch_workers',
+                        type=int,
+                        default=8,
+                        help='number of posts to fetch comments for at once (QnA only)')
 
     return parser
 
@@ -73,8 +80,8 @@ def generate_reddit_json(args: Namespace) -> NoReturn:
     :return: NoReturn
     '''
     try:
-        with open(args.credential_json, 'r') as json_file:
-            credential_info = json.load(json_file)
+        with open(args.credential_json, 'rb') as json_file:
+            credential_info = orjson.loads(json_file.read())
 
         content_gen = ContentGenerator(**credential_info)
 
@@ -90,10 +97,12 @@ def generate_reddit_json(args: Namespace) -> NoReturn:
                                                         time_filter=args.time_filter,
                                                         comment_score_min=args.comment_score_min,
                                                         comment_char_limit=args.comment_char_limit,
-                                                        comment_sort=args.comment_sort)
+                                                        comment_sort=args.comment_sort,
+                                                        fetch_more=args.fetch_more_comments,
+                                                        max_workers=args.fetch_workers)
 
-            with open(output_filepath, 'w') as json_file:
-                json.dump(qna_content, json_file, indent=3)
+            with open(output_filepath, 'wb') as json_file:
+                json_file.write(orjson.dumps(qna_content, option=orjson.OPT_INDENT_2))
 
         elif args.subreddit_type == 'advice':
             output_filepath = 'reddit_advice_content.json'
@@ -106,8 +115,8 @@ def generate_reddit_json(args: Namespace) -> NoReturn:
                                                               post_limit=args.post_limit,
                                                               time_filter=args.time_filter)
 
-            with open(output_filepath, 'w') as json_file:
-                json.dump(advice_content, json_file, indent=3)
+            with open(output_filepath, 'wb') as json_file:
+                json_file.write(orjson.dumps(advice_content, option=orjson.OPT_INDENT_2))
 
         print('Successfully generated reddit content JSON as chosen output folder, please review to finalize text.')
 
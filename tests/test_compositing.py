@@ -0,0 +1,28 @@
+'''Tests for the moviepy renderer compositing'''
+import numpy as np
+import pytest
+
+pytest.importorskip('numba')
+
+# pylint: disable=wrong-import-position
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.video.VideoClip import ImageClip
+
+from lib.compositing import FastComposite
+
+
+@pytest.mark.parametrize('position', [('center', 'center'), (10, 20), (-30, 50), (600, 300)])
+def test_fast_composite_matches_moviepy(position):
+    rng = np.random.default_rng(0)
+    background = ImageClip(rng.integers(0, 256, (360, 640, 3), dtype=np.uint8)).set_duration(1)
+    # overlay with partially transparent pixels, the alpha becomes the overlay's mask
+    overlay = ImageClip(rng.integers(0, 256, (80, 200, 4), dtype=np.uint8),
+                        transparent=True).set_duration(1).set_position(position)
+
+    fast_frame = FastComposite([background, overlay]).get_frame(.5)
+    moviepy_frame = CompositeVideoClip([background, overlay]).get_frame(.5)
+
+    assert fast_frame.dtype == np.uint8
+    assert fast_frame.shape == moviepy_frame.shape
+    # moviepy blends with floats & truncates to uint8, the fixed point blend rounds
+    assert np.abs(fast_frame.astype(np.int16) - moviepy_frame.astype(np.int16)).max() <= 1
@@ -0,0 +1,42 @@
+'''Tests for the Audio Generator Class'''
+import pytest
+
+from lib.generate_audio import AudioGenerator
+
+
+@pytest.fixture(scope='module')
+def audio_gen():
+    '''AudioGenerator without the tts cache, only the text processing is tested.'''
+    return AudioGenerator(cache_mb=0)
+
+
+def test_split_post_body_chunk_length(audio_gen):
+    postbody = ' '.join(f'word{i}' for i in range(200))
+    text_list = audio_gen.split_post_body_into_text_list(postbody, char_in_chunk=50)
+
+    assert all(len(chunk) <= 50 for chunk in text_list)
+    # chunks are split on spaces, no words are lost or split
+    assert ' '.join(text_list) == postbody
+    # each chunk is as long as possible, the next word wouldn't have fit
+    for chunk, next_chunk in zip(text_list, text_list[1:]):
+        assert len(f'{chunk} {next_chunk.split(" ")[0]}') > 50
+
+
+def test_split_post_body_long_words_and_whitespace(audio_gen):
+    postbody = '  a supercalifragilistic\n word   here\r\n  '
+    text_list = audio_gen.split_post_body_into_text_list(postbody, char_in_chunk=5)
+
+    # newlines are removed, words longer than the limit are kept whole
+    assert text_list == ['a', 'supercalifragilistic', 'word', 'here']
+
+
+def test_split_post_body_keeps_hyphenated_words(audio_gen):
+    # textwrap.wrap would split "well-" / "known"
+    text_list = audio_gen.split_post_body_into_text_list('a well-known fact', char_in_chunk=7)
+
+    assert text_list == ['a', 'well-known', 'fact']
+
+
+def test_split_post_body_empty(audio_gen):
+    assert not audio_gen.split_post_body_into_text_list('')
+    assert not audio_gen.split_post_body_into_text_list('  \n ')
@@ -0,0 +1,55 @@
+'''Tests for the Content Generator Class'''
+from random import Random
+from better_profanity import profanity
+from better_profanity.constants import ALLOWED_CHARACTERS
+import pytest
+
+praw = pytest.importorskip('praw')
+
+from lib.generate_reddit_content import ContentGenerator  # pylint: disable=wrong-import-position
+
+
+@pytest.fixture(scope='module')
+def content_gen():
+    '''ContentGenerator without a Reddit client, only the censor is tested.'''
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(praw, 'Reddit', lambda **kwargs: None)
+        yield ContentGenerator('client_id', 'client_secret', 'username', 'password')
+
+
+def _substitute(censor_word: str, rng: Random) -> str:
+    '''Randomly apply better_profanity's character substitutions & upper case letters.'''
+    chars = []
+    for char in censor_word:
+        if char in profanity.CHARS_MAPPING and rng.random() < .3:
+            char = rng.choice(profanity.CHARS_MAPPING[char])
+        if rng.random() < .2:
+            char = char.upper()
+        chars.append(char)
+    return ''.join(chars)
+
+
+# entries with punctuation are a known difference, see ContentGenerator.censor
+CENSOR_WORDS = sorted(str(censor_word) for censor_word in profanity.CENSOR_WORDSET
+                      if all(char in ALLOWED_CHARACTERS or char == ' ' for char in str(censor_word)))
+
+
+@pytest.mark.parametrize('template', ['hello {} there', '{}, the post.', 'so {}'])
+def test_censor_matches_better_profanity(content_gen, template):
+    rng = Random(0)
+    for censor_word in CENSOR_WORDS:
+        for variant in (censor_word, censor_word.upper(), _substitute(censor_word, rng)):
+            text = template.format(variant)
+            assert content_gen.censor(text) == profanity.censor(text), text
+
+
+@pytest.mark.parametrize('text, censored_text', [
+    ('hello s.o.b. there', 'hello **** there'),
+    ('so sh!+', 'so ****'),
+    ('so f-u-c-k', 'so ****'),
+    ('hello blue\twaffle there', 'hello **** there'),
+    ('hello booty, call there', 'hello **** there'),
+    ('I, Sh*t, a class.', 'I, ****, a class.'),
+])
+def test_censor_known_differences(content_gen, text, censored_text):
+    assert content_gen.censor(text) == censored_text
@@ -0,0 +1,145 @@
+'''Tests for the Video Generator Class'''
+import os
+from os.path import join
+import subprocess
+from time import time
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from PIL import Image
+import pytest
+
+import lib.generate_video as generate_video
+from lib.ffmpeg import FFMPEG
+from lib.generate_video import VideoGenerator
+
+
+def _make_background(output_path: str, with_audio: bool) -> str:
+    '''Write an 8 second 16:9 test video, optionally with a sine audio stream.'''
+    ffmpeg_cmd = [FFMPEG, '-y', '-hide_banner', '-loglevel', 'error',
+                  '-f', 'lavfi', '-i', 'testsrc=size=640x360:rate=10:duration=8']
+    if with_audio:
+        ffmpeg_cmd += ['-f', 'lavfi', '-i', 'sine=frequency=220:duration=8', '-c:a', 'aac']
+    subprocess.run([*ffmpeg_cmd, '-c:v', 'libx264', '-preset', 'ultrafast', output_path], check=True)
+    return output_path
+
+
+def _make_audio(output_path: str) -> str:
+    '''Write a 1 second sine wav, same format as the AudioGenerator audio files.'''
+    subprocess.run([FFMPEG, '-y', '-hide_banner', '-loglevel', 'error',
+                    '-f', 'lavfi', '-i', 'sine=frequency=440:duration=1',
+                    '-c:a', 'pcm_s16le', output_path], check=True)
+    return output_path
+
+
+@pytest.fixture(autouse=True)
+def _no_fonts(monkeypatch, tmp_path):
+    '''Text is rendered as a blank image so the tests dont need the text font installed.'''
+    monkeypatch.setattr(generate_video, '_render_text_image',
+                        lambda text, fontsize, font=None: Image.new('RGBA', (200, 80), (255, 255, 255, 255)))
+    monkeypatch.setattr(VideoGenerator, '_text_cache_dir', tmp_path / 'text_cache')
+
+
+@pytest.mark.parametrize('with_audio', [True, False])
+@pytest.mark.parametrize('bg_cache_gb', [0, 2])
+def test_ffmpeg_renderer(tmp_path, with_audio, bg_cache_gb):
+    videos_path = tmp_path / 'videos'
+    videos_path.mkdir()
+    _make_background(str(videos_path / 'background.mp4'), with_audio)
+
+    submission = {
+        'title': {'text': 'title', 'audio_filepath': _make_audio(str(tmp_path / 'title.wav'))},
+        'comments': [{'text': 'comment', 'audio_filepath': _make_audio(str(tmp_path / 'comment.wav'))}],
+    }
+
+    video_gen = VideoGenerator(str(videos_path), hwaccel='none', bg_cache_gb=bg_cache_gb, renderer='ffmpeg')
+    video_gen.generate_video_from_qna_submission(submission, str(tmp_path), max_vid_length=4)
+
+    video_info = ffmpeg_parse_infos(str(tmp_path / video_gen.make_filename('qna')))
+    assert video_info['video_size'] == [1080, 1920]
+    assert video_info['audio_found']
+    assert video_info['duration'] == pytest.approx(4, abs=.3)
+
+
+def test_generate_batch(tmp_path):
+    videos_path = tmp_path / 'videos'
+    videos_path.mkdir()
+    _make_background(str(videos_path / 'background.mp4'), True)
+
+    submissions, output_folders = [], []
+    for i in range(3):
+        submissions.append({
+            'title': {'text': f'title {i}', 'audio_filepath': _make_audio(str(tmp_path / f'title{i}.wav'))},
+            'comments': [{'text': f'comment {i}',
+                          'audio_filepath': _make_audio(str(tmp_path / f'comment{i}.wav'))}],
+        })
+        (tmp_path / f'output{i}').mkdir()
+        output_folders.append(str(tmp_path / f'output{i}'))
+
+    video_gen = VideoGenerator(str(videos_path), hwaccel='none', renderer='ffmpeg')
+    video_gen.generate_batch(submissions, output_folders, max_vid_length=4, max_workers=2)
+
+    for output_folder in output_folders:
+        video_info = ffmpeg_parse_infos(join(output_folder, video_gen.make_filename('qna')))
+        assert video_info['video_size'] == [1080, 1920]
+        assert video_info['audio_found']
+
+
+def test_generate_batch_validates_arguments(tmp_path):
+    videos_path = tmp_path / 'videos'
+    videos_path.mkdir()
+    _make_background(str(videos_path / 'background.mp4'), False)
+    video_gen = VideoGenerator(str(videos_path), hwaccel='none', renderer='ffmpeg')
+
+    with pytest.raises(ValueError):
+        video_gen.generate_batch([{}, {}], [str(tmp_path)])
+    with pytest.raises(ValueError):
+        video_gen.generate_batch([{}], [str(tmp_path)], kind='story')
+
+
+def test_evict_bg_cache_removes_locks_and_stale_temp_files(tmp_path):
+    videos_path = tmp_path / 'videos'
+    cache_path = videos_path / '.cache'
+    cache_path.mkdir(parents=True)
+    video_gen = VideoGenerator(str(videos_path), hwaccel='none', bg_cache_gb=1e-9, renderer='ffmpeg')
+
+    old_time = time() - generate_video.STALE_TEMP_AGE - 60
+    evicted_clip, kept_clip = cache_path / 'key_0.mp4', cache_path / 'key_10.mp4'
+    for clip in (evicted_clip, kept_clip):
+        clip.write_bytes(b'0' * 1024)
+        (cache_path / f'{clip.name}.lock').touch()
+    stale_temp, pending_temp = cache_path / 'key_20.mp4.1.tmp', cache_path / 'key_30.mp4.2.tmp'
+    stale_temp.touch()
+    pending_temp.touch()
+    os.utime(stale_temp, (old_time, old_time))
+
+    video_gen._evict_bg_cache(str(kept_clip))  # pylint: disable=protected-access
+
+    assert not evicted_clip.exists()
+    assert not (cache_path / 'key_0.mp4.lock').exists()
+    assert kept_clip.exists()
+    assert not stale_temp.exists()
+    assert pending_temp.exists()
+
+
+@pytest.mark.parametrize('with_audio', [True, False])
+def test_renderer_parity(tmp_path, with_audio):
+    videos_path = tmp_path / 'videos'
+    videos_path.mkdir()
+    _make_background(str(videos_path / 'background.mp4'), with_audio)
+
+    submission = {
+        'title': {'text': 'title', 'audio_filepath': _make_audio(str(tmp_path / 'title.wav'))},
+        'comments': [{'text': 'comment', 'audio_filepath': _make_audio(str(tmp_path / 'comment.wav'))}],
+    }
+
+    video_infos = {}
+    for renderer in generate_video.RENDERERS:
+        output_folder = tmp_path / renderer
+        output_folder.mkdir()
+        video_gen = VideoGenerator(str(videos_path), hwaccel='none', bg_cache_gb=0, renderer=renderer)
+        video_gen.generate_video_from_qna_submission(submission, str(output_folder), max_vid_length=4)
+        video_infos[renderer] = ffmpeg_parse_infos(str(output_folder / video_gen.make_filename('qna')))
+
+    moviepy_info, ffmpeg_info = video_infos['moviepy'], video_infos['ffmpeg']
+    assert moviepy_info['video_size'] == ffmpeg_info['video_size'] == [1080, 1920]
+    assert moviepy_info['audio_found'] and ffmpeg_info['audio_found']
+    assert moviepy_info['duration'] == pytest.approx(ffmpeg_info['duration'], abs=.3)